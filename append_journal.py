@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from record_store import synchronized
+from storage import get_storage
+
+try:
+    import msvcrt
+except ImportError:  # Windows 以外では fcntl でロックする
+    msvcrt = None
+    import fcntl
+
+# 保存先に反映する前の記録を書いておくジャーナル（1行1件のJSON）
+JOURNAL_FILE = "master_duel_records.journal"
+# 保存先への書き込みを他のウィンドウ・プロセスと排他するためのロックファイル
+LOCK_FILE = "master_duel_records.lock"
+# ジャーナルの読み書きを排他するためのロックファイル
+JOURNAL_LOCK_FILE = "master_duel_records.journal.lock"
+# 最初の記録をジャーナルに書いてから、保存先にまとめて反映するまでの時間（秒）
+GROUP_COMMIT_DELAY = 2.0
+# この件数がたまったら待たずに反映する
+GROUP_COMMIT_SIZE = 20
+# 反映に失敗したとき（CSVを他のアプリで開いている場合など）にやり直すまでの時間（秒）
+COMMIT_RETRY_DELAY = 10.0
+
+# ロックファイルのパス -> ロックの状態（同じスレッドからの入れ子の取得はファイルをロックし直さない）
+_lock_states = {}
+_lock_states_guard = threading.Lock()
+
+
+def _lock_file(f):
+    f.seek(0)
+    if msvcrt is not None:
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_file(f):
+    f.seek(0)
+    if msvcrt is not None:
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def write_lock(path=LOCK_FILE):
+    """保存先への書き込み中に、他のスレッド・プロセスの書き込みを待たせる"""
+    with _lock_states_guard:
+        state = _lock_states.setdefault(path, {"lock": threading.RLock(), "depth": 0, "file": None})
+    with state["lock"]:
+        if state["depth"] == 0:
+            f = open(path, "a+b")
+            try:
+                _lock_file(f)
+            except OSError:
+                f.close()
+                raise
+            state["file"] = f
+        state["depth"] += 1
+        try:
+            yield
+        finally:
+            state["depth"] -= 1
+            if state["depth"] == 0:
+                f = state["file"]
+                state["file"] = None
+                _unlock_file(f)
+                f.close()
+
+
+def journal_lock(path=JOURNAL_LOCK_FILE):
+    """
+    ジャーナルの読み書き中に、他のスレッド・プロセスのジャーナルの操作を待たせる。
+    保存先への反映（write_lock）とは別のロックにし、反映中でも記録をジャーナルに書けるようにする。
+    """
+    return write_lock(path)
+
+
+def read_journal(path=JOURNAL_FILE):
+    """
+    ジャーナルを読み込む。書きかけの行（途中で終了した場合の最終行）以降は無視する。
+    :return: (記録のリスト, 反映を始めた時点の保存先の commit_marker。反映前なら None)
+    """
+    records, marker = [], None
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return records, marker
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line.decode("utf-8"))
+            except (UnicodeDecodeError, ValueError):
+                break
+            if "record" in entry:
+                records.append(entry["record"])
+            elif "commit" in entry:
+                marker = entry["commit"]
+    return records, marker
+
+
+class AppendJournal:
+    """
+    記録の保存を先行書き込みのジャーナルで受け付ける。
+    append はジャーナルに1行追記して fsync するだけで戻り、保存先への反映はタイマーのスレッドで
+    GROUP_COMMIT_DELAY 秒後（GROUP_COMMIT_SIZE 件たまった場合はすぐ）にまとめて1回で行う。
+    ジャーナルは同じ保存先を使う他のプロセスと共有するため、読み書きはすべて journal_lock の中で行い、
+    反映ではどのプロセスが書いた記録かによらずジャーナルにある記録をすべて反映する。
+    反映の前に保存先の commit_marker をジャーナルに書いておき、反映の途中で終了した場合は
+    次回の反映時にその時点まで保存先を戻してから反映し直す（記録の欠落・重複や書きかけの行を残さない）。
+    保存先がその後に外部で編集されていて戻せない場合は、戻さずに反映する（記録が重複することはあるが、失わない）。
+    まとめての反映に失敗した場合は記録をジャーナルに残したまま COMMIT_RETRY_DELAY 秒後にやり直し、
+    on_error が設定されていれば、続けて失敗している間の最初の1回だけ例外を渡して呼び出す
+    （タイマーのスレッドから呼ばれるため、画面の操作は呼び出し側で画面のスレッドに回す）。
+    """
+
+    def __init__(self, path=JOURNAL_FILE, delay=GROUP_COMMIT_DELAY, batch_size=GROUP_COMMIT_SIZE):
+        self.path = path
+        self.delay = delay
+        self.batch_size = batch_size
+        self._recovered = False
+        self._timer = None
+        self._failing = False  # 直前の反映が失敗したか
+        self.on_error = None  # 反映に失敗したときに例外を渡して呼ぶ関数
+        self._lock = threading.RLock()  # _recovered・_timer・_failing を守る（反映中は持たない）
+
+    def _recover(self):
+        """初回だけ、前回反映されなかった記録がジャーナルに残っていれば反映を予約する"""
+        with self._lock:
+            if self._recovered:
+                return
+            self._recovered = True
+            if os.path.exists(self.path):
+                self._schedule(0)
+
+    def _write_entry(self, entry):
+        """ジャーナルに1行追記する（journal_lock の中で呼ぶ。他のプロセスが置き換えられるよう開いたままにしない）"""
+        with open(self.path, "ab") as f:
+            f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, record):
+        """記録をジャーナルに書き込む（保存先への反映はタイマーのスレッドでまとめて後で行う）"""
+        self._recover()
+        record = {key: str(value) for key, value in record.items()}
+        with journal_lock():
+            self._write_entry({"record": record})
+            count = len(read_journal(self.path)[0])
+        with self._lock:
+            if count >= self.batch_size:
+                self._schedule(0)
+            elif self._timer is None:
+                self._schedule(self.delay)
+
+    @synchronized
+    def _schedule(self, delay):
+        """delay 秒後の反映を予約する（予約済みのものは取り消す）"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self.try_commit)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def try_commit(self):
+        """commit を行い、失敗したら on_error で知らせて後でやり直す（例外は送出しない）"""
+        try:
+            self.commit()
+        except Exception as e:
+            with self._lock:
+                self._schedule(COMMIT_RETRY_DELAY)
+                report = not self._failing
+                self._failing = True
+            if report and self.on_error is not None:
+                self.on_error(e)
+
+    def pending(self):
+        """保存先に未反映の記録（他のプロセスが書いたものを含む）を返す"""
+        self._recover()
+        with journal_lock():
+            return read_journal(self.path)[0]
+
+    def commit(self):
+        """
+        ジャーナルにある未反映の記録を保存先にまとめて反映し、反映した記録をジャーナルから除く。
+        呼び出したスレッドで反映する（画面のスレッドからは呼ばない）。反映中に追記された記録は残す。
+        """
+        with self._lock:
+            self._recovered = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not os.path.exists(self.path):
+            return
+        with write_lock():
+            with journal_lock():
+                records, marker = read_journal(self.path)
+                if records:
+                    storage = get_storage()
+                    if marker is None:
+                        self._write_entry({"commit": storage.commit_marker()})
+            if records:
+                if marker is not None:
+                    storage.rollback_to(marker)  # 中断された反映を（戻せる場合は）取り消してからやり直す
+                from monthly_rollup import append_records  # 集計モジュールは起動後に読み込む
+                append_records(storage, records)
+            with journal_lock():
+                self._remove_committed(len(records))
+        with self._lock:
+            self._failing = False
+
+    def _remove_committed(self, count):
+        """先頭から count 件の記録を反映済みとしてジャーナルから除く（journal_lock の中で呼ぶ）"""
+        remaining = read_journal(self.path)[0][count:]
+        if not remaining:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            for record in remaining:
+                f.write(json.dumps({"record": record}, ensure_ascii=False).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        with self._lock:
+            self._schedule(self.delay)  # 反映中に追記された記録も後で反映する
+
+
+# プロセス全体で共有するジャーナル
+shared_journal = AppendJournal()
@@ -0,0 +1,82 @@
+import tkinter as tk
+
+# 候補として表示する最大件数
+MAX_SUGGESTIONS = 8
+# 候補一覧の操作に使うキー（文字入力として扱わない）
+_NAVIGATION_KEYS = {"Up", "Down", "Return", "KP_Enter", "Escape", "Tab"}
+
+
+def attach_autocomplete(entry, get_completer):
+    """
+    Entry に入力候補のドロップダウンを付ける。
+    キー入力のたびに get_completer() の候補を引き、Entry の直下に一覧を重ねて表示する。
+    ↑↓で選択、Enter/クリックで確定、Esc で閉じる。
+    :param get_completer: 現在の DeckNameCompleter を返す関数（まだ用意できていなければ None）
+    """
+    listbox = tk.Listbox(entry.winfo_toplevel(), height=MAX_SUGGESTIONS, exportselection=False)
+
+    def hide():
+        listbox.place_forget()
+
+    def is_shown():
+        return bool(listbox.winfo_ismapped())
+
+    def show(suggestions):
+        listbox.delete(0, tk.END)
+        for name in suggestions:
+            listbox.insert(tk.END, name)
+        listbox.config(height=len(suggestions))
+        listbox.place(in_=entry, x=0, rely=1.0, relwidth=1.0)
+        listbox.lift()
+
+    def update_suggestions(event):
+        if event.keysym in _NAVIGATION_KEYS:
+            return
+        completer = get_completer()
+        text = entry.get()
+        suggestions = completer.suggest(text, MAX_SUGGESTIONS) if completer is not None and text.strip() else []
+        if suggestions:
+            show(suggestions)
+        else:
+            hide()
+
+    def move_selection(step):
+        if not is_shown():
+            return None
+        current = listbox.curselection()
+        index = current[0] + step if current else (0 if step > 0 else listbox.size() - 1)
+        index = max(0, min(index, listbox.size() - 1))
+        listbox.selection_clear(0, tk.END)
+        listbox.selection_set(index)
+        listbox.see(index)
+        return "break"
+
+    def accept(event=None):
+        """選択中の候補を Entry に入れる"""
+        if not is_shown() or not listbox.curselection():
+            return None
+        entry.delete(0, tk.END)
+        entry.insert(0, listbox.get(listbox.curselection()[0]))
+        entry.icursor(tk.END)
+        hide()
+        entry.focus_set()
+        return "break"
+
+    def on_escape(event):
+        if not is_shown():
+            return None
+        hide()
+        return "break"
+
+    def on_focus_out(event):
+        # 一覧のクリックでフォーカスが移る場合があるため、少し待ってから閉じる
+        entry.after(150, lambda: hide() if entry.focus_get() not in (entry, listbox) else None)
+
+    entry.bind("<KeyRelease>", update_suggestions, add="+")
+    entry.bind("<Down>", lambda event: move_selection(1), add="+")
+    entry.bind("<Up>", lambda event: move_selection(-1), add="+")
+    entry.bind("<Return>", accept, add="+")
+    entry.bind("<KP_Enter>", accept, add="+")
+    entry.bind("<Escape>", on_escape, add="+")
+    entry.bind("<FocusOut>", on_focus_out, add="+")
+    listbox.bind("<ButtonRelease-1>", accept)
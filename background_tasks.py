@@ -0,0 +1,73 @@
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from append_journal import shared_journal
+from instrumentation import timed
+
+# 完了確認の間隔（ミリ秒）
+POLL_INTERVAL_MS = 30
+
+# 読み込み・集計を行う共有ワーカー（データ層の処理を直列に実行する）
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+
+
+class LatestJobRunner:
+    """
+    分析ウィンドウの読み込み・集計をワーカースレッドで実行し、結果を root.after 経由で画面に反映する。
+    ジョブの前にジャーナルの記録を保存先に反映し、保存した直後の記録も集計に含める。
+    新しいジョブを投げると、それ以前のジョブは未開始なら取り消し、実行済みでも結果を捨てる
+    （前の月/次の月を連打しても最後の月だけが描画される）。
+    """
+
+    def __init__(self, widget):
+        self.widget = widget
+        self._generation = 0
+        self._future = None
+
+    def submit(self, job, on_done, on_error=None, operation=None):
+        """
+        job をワーカーで実行し、完了後に画面スレッドで on_done(結果) を呼ぶ。
+        :param on_error: 例外発生時に画面スレッドで呼ぶ関数（省略時は握りつぶさず表示する）
+        :param operation: 計測を有効にしている場合に、job の処理時間を記録する名前
+        """
+        self.cancel()
+        generation = self._generation
+        measured = job if operation is None else timed(operation)(job)
+
+        def run():
+            shared_journal.try_commit()  # 失敗は on_error で知らされ、集計は保存先の記録で続ける
+            return measured()
+
+        future = _executor.submit(run)
+        self._future = future
+
+        def poll():
+            if generation != self._generation or future.cancelled():
+                return  # 新しいジョブに置き換えられた
+            if not future.done():
+                self._schedule(poll)
+                return
+            try:
+                result = future.result()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+                else:
+                    raise
+            else:
+                on_done(result)
+
+        self._schedule(poll)
+
+    def cancel(self):
+        """実行待ち・実行中のジョブの結果を反映しないようにする"""
+        self._generation += 1
+        if self._future is not None:
+            self._future.cancel()  # まだ開始していなければ実行自体を取り消す
+            self._future = None
+
+    def _schedule(self, callback):
+        try:
+            self.widget.after(POLL_INTERVAL_MS, callback)
+        except tk.TclError:
+            # ウィンドウが閉じられた後は何もしない
+            pass
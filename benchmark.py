@@ -0,0 +1,347 @@
+"""
+主要な処理の所要時間とピークメモリを、乱数の種を固定した合成データで計測する（画面は開かない）。
+
+    python benchmark.py
+    python benchmark.py --rows 1000 1000000 --output results.json
+    python benchmark.py --baseline results.json
+
+行数ごとに合成した master_duel_records.csv を一時フォルダに作り、計測は1項目ずつ別プロセスで行う
+（キャッシュが空の状態の初回と、キャッシュが効いた2回目以降を分けて測る）。
+--output の JSON を --baseline に渡すと、前回の結果との比を表示する。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+
+DEFAULT_ROWS = (1000, 10000, 100000)
+DEFAULT_REPEAT = 5
+DEFAULT_SEED = 1
+# 結果のJSONの形式バージョン（項目を変えたら上げる）
+RESULT_FORMAT = 1
+# 初回の所要時間が基準の何倍を超えたら遅くなったとみなす（2回目以降は短く、タイマーの誤差に埋もれるため使わない）
+REGRESSION_RATIO = 1.2
+
+# 合成データの最終日と、1日あたりの平均対戦数
+END_DATE = date(2024, 12, 31)
+MATCHES_PER_DAY = 120
+# デッキ名（使用率は順位の逆数に比例させ、上位に偏らせる）
+DECKS = [
+    "スネークアイ", "ティアラメンツ", "烙印", "ラビュリンス", "ユベル", "炎王", "神碑", "センチュリオン",
+    "R-ACE", "ピュアリィ", "天盃龍", "ヴァレット", "クシャトリラ", "六花", "ふわんだりぃず", "エクソシスター",
+    "魔救", "電脳堺", "閃刀姫", "蟲惑魔", "デスピア", "勇者", "ヌーベルズ", "メメント",
+    "ホルス", "ライゼオル", "ヤミー", "マナドゥム", "白き森", "不明",
+]
+DECK_SKEW = 1.1
+# 自分の使用デッキを対戦ごとに変える確率
+DECK_SWITCH_RATE = 0.02
+MEMO_RATE = 0.2
+MEMO_PHRASES = [
+    "手札誘発を引けず", "初動が通った", "うらら・泡影で止まった", "サレンダー", "回線落ち",
+    "後攻ワンキル", "ニビルで返された", "事故", "相手が長考", "エクストラ確認忘れ",
+    "\"G\"を打たれた", "先攻展開, 妨害3つ",
+]
+
+# 計測項目（名前 -> 計測する処理の説明）
+BENCHMARKS = {
+    "read_csv_by_month": "月の記録の読み込み（レート推移の月表示）",
+    "load_last_record": "最後の記録の読み込み（入力画面の初期値）",
+    "month_summary": "月の戦績まとめ",
+    "range_summary": "期間（直近30日）の戦績まとめ",
+    "rate_graph_range": "レート推移の期間表示の読み込み",
+    "rate_graph_draw": "レート推移の月表示のグラフ描画（間引き・目盛りを含む）",
+    "environment_month": "環境分布の月表示の集計",
+    "environment_range": "環境分布の期間表示の集計",
+    "environment_draw": "環境分布の月表示のグラフ描画",
+    "data_editor_load": "データ編集画面の先頭ページの読み込み",
+    "data_editor_save": "データ編集画面の1行の変更の保存",
+}
+
+
+def generate_records(path, rows, seed=DEFAULT_SEED):
+    """
+    乱数の種から毎回同じ合成の戦績CSVを作る。
+    相手デッキの分布は上位に偏らせ、自分のデッキは時々だけ変える。
+    コインの表裏で先攻・後攻の選びやすさ、先攻・後攻で勝率を変え、
+    レートは勝敗で上下させる。備考には改行・カンマ・引用符を含むものも混ぜる。
+    """
+    from match_table import RANKS
+    from record_store import CSV_ENCODING
+    from storage import FIELDNAMES
+    import csv
+
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** DECK_SKEW for rank in range(len(DECKS))]
+    days = max(1, rows // MATCHES_PER_DAY)
+    first_day = END_DATE - timedelta(days=days - 1)
+    deck = rng.choice(DECKS[:8])
+    rank = RANKS.index("G5")
+    rate = 1500
+    with open(path, "w", encoding=CSV_ENCODING, newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        for i in range(rows):
+            day = first_day + timedelta(days=i * days // rows)
+            if rng.random() < DECK_SWITCH_RATE:
+                deck = rng.choice(DECKS[:8])
+            coin = "表" if rng.random() < 0.5 else "裏"
+            first = rng.random() < (0.9 if coin == "表" else 0.1)
+            win = rng.random() < (0.58 if first else 0.45)
+            rate = max(0, rate + (rng.randint(5, 15) if win else -rng.randint(5, 15)))
+            if rng.random() < 0.1:
+                rank = min(max(rank + (1 if win else -1), 0), len(RANKS) - 1)
+            memo = ""
+            if rng.random() < MEMO_RATE:
+                memo = rng.choice(MEMO_PHRASES)
+                if rng.random() < 0.25:
+                    memo += "\n" + rng.choice(MEMO_PHRASES)
+            writer.writerow([
+                day.strftime("%Y/%m/%d"), deck, coin, "先攻" if first else "後攻",
+                rng.choices(DECKS, weights)[0], "勝" if win else "敗", RANKS[rank], rate, memo,
+            ])
+
+
+def benchmark_job(name):
+    """
+    計測項目の処理を返す（カレントフォルダの記録を対象にする）。
+    各画面がワーカーで行う読み込み・集計と同じ関数を呼ぶ。グラフの描画は画面と同じ描画関数を
+    Agg バックエンドの Figure に対して呼び、描画するデータは計測の前に読み込んでおく。
+    """
+    from storage import get_storage
+    last_month = END_DATE.strftime("%Y/%m")
+    range_start, range_end = END_DATE - timedelta(days=29), END_DATE
+    if name == "read_csv_by_month":
+        from menu_functions_utils import read_csv_by_month
+        return lambda: read_csv_by_month(last_month)
+    if name == "load_last_record":
+        return lambda: get_storage().last_record()
+    if name == "month_summary":
+        from online_stats import month_summary
+        return lambda: month_summary(last_month)
+    if name == "range_summary":
+        from range_stats import range_summary
+        return lambda: range_summary(range_start, range_end)
+    if name == "rate_graph_range":
+        return lambda: get_storage().rows_in_range(range_start, range_end)
+    if name == "environment_month":
+        from monthly_rollup import month_opponent_deck_counts
+        return lambda: month_opponent_deck_counts(last_month)
+    if name == "environment_range":
+        from range_stats import range_opponent_deck_counts
+        return lambda: range_opponent_deck_counts(range_start, range_end)
+    if name == "rate_graph_draw":
+        figure, canvas = _headless_figure(6, 3)
+        from menu_functions_utils import read_csv_by_month
+        from rate_graph import create_rate_axes, plot_rate_graph
+        artists = create_rate_axes(figure)
+        data = read_csv_by_month(last_month)
+
+        def draw_rate_graph():
+            plot_rate_graph(artists, last_month, data, True, figure.get_figwidth() * figure.dpi)
+            canvas.draw()
+        return draw_rate_graph
+    if name == "environment_draw":
+        figure, canvas = _headless_figure(5, 3)
+        from monthly_rollup import month_opponent_deck_counts
+        from environment_distribution import plot_environment
+        ax = figure.add_subplot(111)
+        drawn = {"kind": None, "bars": None}
+        deck_counts = month_opponent_deck_counts(last_month)
+
+        def draw_environment():
+            plot_environment(ax, drawn, last_month, deck_counts, "pie")
+            canvas.draw()
+        return draw_environment
+    if name == "data_editor_load":
+        from data_editor import load_fieldnames, read_page
+        return lambda: (load_fieldnames(), read_page(0))
+    if name == "data_editor_save":
+        from data_editor import read_page, save_changes
+
+        def save_one_change():
+            storage = get_storage()
+            key, row = read_page(0)[2][0]
+            values = [row.get(field, "") for field in storage.fieldnames]
+            values[-1] = "計測" if values[-1] != "計測" else ""
+            save_changes({key: values}, set(), [])
+        return save_one_change
+    raise ValueError(f"不明な計測項目です: {name}")
+
+
+def _headless_figure(width, height):
+    """画面と同じ大きさの Figure を、画面を開かない Agg バックエンドで作る"""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    figure = Figure(figsize=(width, height), dpi=100)
+    return figure, FigureCanvasAgg(figure)
+
+
+def run_worker(name, repeat, memory):
+    """
+    カレントフォルダの記録で1項目を計測する（別プロセスで呼ぶ）。
+    :param memory: True ならキャッシュが空の状態の1回だけを tracemalloc で測り、ピークメモリを返す
+    """
+    import time
+    from storage import get_storage
+    get_storage()  # 保存先の準備（SQLiteへの初回取り込みを含む）は計測に含めない
+    job = benchmark_job(name)
+    if memory:
+        import tracemalloc
+        tracemalloc.start()
+        job()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"peak_kib": round(peak / 1024)}
+    start = time.perf_counter()
+    job()
+    cold = time.perf_counter() - start
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        job()
+        warm.append(time.perf_counter() - start)
+    warm.sort()
+    return {
+        "cold_ms": round(cold * 1000, 3),
+        "warm_ms": round(warm[len(warm) // 2] * 1000, 3) if warm else None,
+        "warm_min_ms": round(warm[0] * 1000, 3) if warm else None,
+    }
+
+
+def _spawn_worker(folder, name, repeat, memory):
+    """別プロセスで run_worker を実行し、結果の辞書を返す"""
+    command = [sys.executable, os.path.abspath(__file__), "--worker", name, "--dir", folder, "--repeat", str(repeat)]
+    if memory:
+        command.append("--memory")
+    completed = subprocess.run(command, capture_output=True, text=True, encoding="utf-8", check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _prepare_folder(folder, backend):
+    """計測用フォルダを、キャッシュ（サイドカー・SQLite・月別集計）のない状態にする"""
+    from sidecar_cache import sidecar_path
+    from monthly_rollup import rollup_path
+    from storage import DB_FILE
+    from record_store import CSV_FILE
+    csv_path, db_path = os.path.join(folder, CSV_FILE), os.path.join(folder, DB_FILE)
+    for path in (sidecar_path(csv_path), rollup_path(csv_path), db_path, rollup_path(db_path)):
+        if os.path.exists(path):
+            os.remove(path)
+    with open(os.path.join(folder, "settings.ini"), "w") as f:
+        f.write(f"[Settings]\nStorageBackend = {backend}\n")
+
+
+def run_benchmarks(row_counts, names, repeat, seed, backend, log=print):
+    """
+    行数ごとに合成データを作り、各項目を別プロセスで計測した結果のリストを返す。
+    :param log: 進み具合を表示する関数
+    """
+    from record_store import CSV_FILE
+    results = []
+    root = tempfile.mkdtemp(prefix="md_benchmark_")
+    try:
+        for rows in row_counts:
+            source = os.path.join(root, f"source_{rows}")
+            os.makedirs(source)
+            log(f"合成データを作成中: {rows}行")
+            generate_records(os.path.join(source, CSV_FILE), rows, seed)
+            for name in names:
+                log(f"計測中: {name} ({rows}行)")
+                # 保存の計測は記録を書き換えるため、毎回元のデータを複製したフォルダで行う
+                folder = os.path.join(root, f"{name}_{rows}")
+                shutil.copytree(source, folder)
+                _prepare_folder(folder, backend)
+                result = {"benchmark": name, "rows": rows}
+                result.update(_spawn_worker(folder, name, repeat, memory=False))
+                _prepare_folder(folder, backend)
+                result.update(_spawn_worker(folder, name, repeat, memory=True))
+                shutil.rmtree(folder)
+                results.append(result)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def format_result(result, baseline=None):
+    """1項目の結果を1行の文字列にする（基準があれば初回の所要時間の比を付ける）"""
+    line = (f"{result['benchmark']:<20} {result['rows']:>8}行  初回 {result['cold_ms']:>10.2f} ms  "
+            f"2回目以降 {result['warm_ms']:>10.2f} ms  ピーク {result['peak_kib']:>8} KiB")
+    if baseline:
+        ratio = result["cold_ms"] / baseline["cold_ms"] if baseline["cold_ms"] else float("inf")
+        line += f"  基準比 {ratio:5.2f}倍{' (遅化)' if ratio > REGRESSION_RATIO else ''}"
+    return line
+
+
+def _commit_id():
+    """計測したソースの git のコミット（取得できなければ None）"""
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return completed.stdout.strip() or None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="主要な処理の所要時間とピークメモリを計測する")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(DEFAULT_ROWS), help="合成データの行数（複数指定可）")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="計測する項目（省略時はすべて）")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="2回目以降の計測回数")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="合成データの乱数の種")
+    parser.add_argument("--backend", choices=("csv", "sqlite"), default="csv", help="保存形式")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル")
+    parser.add_argument("--baseline", help="比較する以前の結果のJSONファイル")
+    parser.add_argument("--generate", metavar="PATH", help="計測せず、合成データのCSVだけを作る（行数は --rows の最初の値）")
+    parser.add_argument("--worker", choices=list(BENCHMARKS), help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    parser.add_argument("--memory", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        os.chdir(args.dir)
+        print(json.dumps(run_worker(args.worker, args.repeat, args.memory)))
+        return 0
+    if args.generate:
+        generate_records(args.generate, args.rows[0], args.seed)
+        return 0
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {(item["benchmark"], item["rows"]): item for item in json.load(f)["results"]}
+    results = run_benchmarks(args.rows, args.only or list(BENCHMARKS), args.repeat, args.seed, args.backend,
+                             log=lambda line: print(line, file=sys.stderr))
+    for result in results:
+        print(format_result(result, baseline.get((result["benchmark"], result["rows"]))))
+
+    if args.output:
+        import platform
+        from datetime import datetime
+        report = {
+            "format": RESULT_FORMAT,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit_id(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
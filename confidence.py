@@ -0,0 +1,48 @@
+import math
+
+# 信頼区間の信頼水準と、対応する標準正規分布の両側点
+CONFIDENCE_LEVEL = 95
+Z_VALUE = 1.959963984540054
+
+# 集計値の比率 -> (成功数, 試行数) のキー（summarize_counts の結果に対応）
+RATE_BASES = {
+    "win_rate": ("win_count", "total_matches"),
+    "heads_rate": ("heads_count", "total_matches"),
+    "first_turn_rate": ("first_turn_count", "total_matches"),
+    "heads_win_rate": ("heads_win_count", "heads_count"),
+    "tails_win_rate": ("tails_win_count", "tails_count"),
+    "heads_first_turn_rate": ("heads_first_turn_count", "heads_count"),
+    "tails_first_turn_rate": ("tails_first_turn_count", "tails_count"),
+    "first_turn_win_rate": ("first_turn_win_count", "first_turn_count"),
+    "second_turn_win_rate": ("second_turn_win_count", "second_turn_count"),
+}
+
+
+def wilson_interval(successes, trials, z=Z_VALUE):
+    """
+    比率の Wilson スコア信頼区間を (下限%, 上限%) で返す。
+    件数が少ない・比率が0%や100%に近い場合でも区間が [0, 100] に収まる。試行数が0なら None。
+    """
+    if trials <= 0:
+        return None
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - margin) * 100, min(1.0, center + margin) * 100
+
+
+def rate_intervals(stats):
+    """集計値の各比率の信頼区間を {比率のキー: (下限%, 上限%) または None} で返す"""
+    return {key: wilson_interval(stats[successes], stats[trials])
+            for key, (successes, trials) in RATE_BASES.items()}
+
+
+def format_rate(stats, key):
+    """比率を「52.31% (95%CI 40.1～63.9%, 30戦)」の形式にする"""
+    _, trials = RATE_BASES[key]
+    interval = stats["intervals"][key]
+    if interval is None:
+        return f"{stats[key]:.2f}% (0戦)"
+    low, high = interval
+    return f"{stats[key]:.2f}% ({CONFIDENCE_LEVEL}%CI {low:.1f}～{high:.1f}%, {stats[trials]}戦)"
\ No newline at end of file
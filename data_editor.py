@@ -1,11 +1,47 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import csv
-
-CSV_FILE = "master_duel_records.csv"
+from storage import get_storage
+from append_journal import shared_journal, write_lock
+from instrumentation import timed
 
 # グローバル辞書でウィンドウ管理（すべてのウィンドウを統一管理する）
 open_windows = {}
+# 1ページに表示する行数（表示する分だけTreeviewに読み込む）
+PAGE_SIZE = 200
+
+def load_fieldnames():
+    """ジャーナルの記録を保存先に反映してから、保存先の列名を返す（記録がなければ FileNotFoundError）"""
+    shared_journal.commit()  # 入力画面で保存した直後の記録も表示する
+    storage = get_storage()
+    if not storage.fieldnames:
+        raise FileNotFoundError(storage.path)
+    return list(storage.fieldnames)
+
+
+def read_page(start):
+    """
+    start 行目を含むページを保存先から取り出す（start は最終ページの先頭までに収める）。
+    :return: (ページ先頭の行番号, 全件数, (行のキー, 記録) のリスト)
+    """
+    storage = get_storage()
+    total = storage.row_count()
+    start = max(0, min(start, (max(total - 1, 0) // PAGE_SIZE) * PAGE_SIZE))
+    return start, total, storage.rows_slice(start, PAGE_SIZE)
+
+
+def save_changes(updates, deletes, inserts):
+    """
+    データ編集の変更を保存先に反映し、影響する月の集計も更新する。
+    :param updates: 行のキー -> 編集後の値
+    :param deletes: 削除する行のキーの集合
+    :param inserts: 追加する行の値のリスト
+    """
+    # ジャーナルの記録は末尾に追記されるだけなので、先に反映しても行のキーは変わらない
+    shared_journal.commit()
+    from monthly_rollup import apply_changes  # 集計モジュールは起動後に読み込む
+    with write_lock():
+        apply_changes(get_storage(), updates, deletes, inserts)
+
 
 def open_data_editor():
     # ウィンドウキー
@@ -17,40 +53,100 @@ def open_data_editor():
         return
 
     unsaved_changes = [False]  # 変更状態を追跡する変数（リストでmutableにする）
+    # 保存時に差分だけを反映するための変更追跡（ページを移動しても保持する）
+    updates = {}  # 保存先での行のキー -> 編集後の値
+    deleted_keys = set()  # 削除された既存行のキー
+    inserts = []  # 追加された行の値（削除された追加行は None）
+    # 表示中のページ
+    page_start = [0]  # 表示中ページ先頭の行番号
+    item_sources = {}  # Treeviewの行ID -> ("stored", キー) または ("new", inserts の添字)
+    item_values = {}  # Treeviewの行ID -> 表示中の値
 
+    @timed("data_editor.load_csv_data", rows=None)
     def load_csv_data():
-        """CSVからデータを読み込んでTreeviewに表示する"""
-        tree.delete(*tree.get_children())
+        """保存先のヘッダーを読み込み、先頭ページを表示する"""
         try:
-            with open(CSV_FILE, mode="r", encoding="mbcs") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    tree.insert("", "end", values=list(row.values()))
-                return reader.fieldnames
+            return load_fieldnames()
         except FileNotFoundError:
             messagebox.showerror("エラー", "CSVファイルが見つかりません。")
         except Exception as e:
             messagebox.showerror("エラー", f"エラー: {e}")
         return []
 
+    @timed("data_editor.show_page", rows=None)
+    def show_page(start, select_index=None):
+        """
+        start 行目から PAGE_SIZE 件だけを保存先から取り出してTreeviewに表示する。
+        最終ページには未保存の追加行も表示する。
+        :param select_index: 表示後に選択する行番号（全体での通し番号）
+        """
+        start, total, rows = read_page(start)
+        page_start[0] = start
+        tree.delete(*tree.get_children())
+        item_sources.clear()
+        item_values.clear()
+
+        def insert(source, values):
+            item = tree.insert("", "end", values=values)
+            item_sources[item] = source
+            item_values[item] = list(values)
+            return item
+
+        selected = None
+        for index, (key, row) in enumerate(rows, start):
+            if key in deleted_keys:
+                continue
+            item = insert(("stored", key), updates.get(key, list(row.values())))
+            if index == select_index:
+                selected = item
+        is_last_page = start + PAGE_SIZE >= total
+        if is_last_page:
+            for i, values in enumerate(inserts):
+                if values is None:
+                    continue
+                item = insert(("new", i), values)
+                if select_index == total + i:
+                    selected = item
+
+        end = min(start + PAGE_SIZE, total)
+        page_label.config(text=f"{start + 1 if total else 0}-{end} / {total}件")
+        prev_page_button.config(state="normal" if start > 0 else "disabled")
+        next_page_button.config(state="disabled" if is_last_page else "normal")
+        if selected is not None:
+            tree.selection_set(selected)
+            tree.see(selected)
+
+    def jump_to_row():
+        """入力された行番号を含むページへ移動する"""
+        text = jump_entry.get().strip()
+        if not text.isdigit() or int(text) < 1:
+            messagebox.showwarning("警告", "行番号を入力してください。")
+            return
+        index = int(text) - 1
+        show_page((index // PAGE_SIZE) * PAGE_SIZE, select_index=index)
+
+    @timed("data_editor.save_csv_data", rows=None)
     def save_csv_data():
-        """Treeviewの内容をCSVに保存"""
+        """変更された行だけを保存先に反映する"""
         try:
-            with open(CSV_FILE, mode="w", encoding="mbcs", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                for child in tree.get_children():
-                    writer.writerow(tree.item(child)["values"])
+            new_rows = [values for values in inserts if values is not None]
+            if updates or deleted_keys or new_rows:
+                save_changes(dict(updates), set(deleted_keys), new_rows)
+                updates.clear()
+                deleted_keys.clear()
+                inserts.clear()
+                show_page(page_start[0])  # 行のキーが変わるため表示し直す
             unsaved_changes[0] = False  # 保存が成功したので変更フラグをリセット
             messagebox.showinfo("保存完了", "データを保存しました！")
         except Exception as e:
             messagebox.showerror("エラー", f"保存中にエラーが発生しました: {e}")
 
     def add_row():
-        """新しい行を追加"""
-        empty_row = [""] * len(headers)
-        tree.insert("", "end", values=empty_row)
+        """新しい行を追加（最終ページに表示される）"""
+        inserts.append([""] * len(headers))
         unsaved_changes[0] = True  # データに変更があったことを示す
+        total = get_storage().row_count()
+        show_page(total, select_index=total + len(inserts) - 1)
 
     def delete_row():
         """選択した行を削除"""
@@ -59,6 +155,12 @@ def open_data_editor():
             messagebox.showwarning("警告", "削除する行を選択してください。")
             return
         for item in selected_item:
+            kind, key = item_sources.pop(item)
+            if kind == "stored":
+                deleted_keys.add(key)
+                updates.pop(key, None)
+            else:
+                inserts[key] = None
             tree.delete(item)
         unsaved_changes[0] = True  # データに変更があったことを示す
 
@@ -70,8 +172,15 @@ def open_data_editor():
             return
 
         selected_item = selected_item[0]
-        for i, entry in enumerate(edit_entries):
-            tree.set(selected_item, column=headers[i], value=entry.get())
+        values = [entry.get() for entry in edit_entries]
+        for i, value in enumerate(values):
+            tree.set(selected_item, column=headers[i], value=value)
+        item_values[selected_item] = values
+        kind, key = item_sources[selected_item]
+        if kind == "stored":
+            updates[key] = values
+        else:
+            inserts[key] = values
         unsaved_changes[0] = True  # データに変更があったことを示す
 
     def on_row_select(event):
@@ -81,7 +190,7 @@ def open_data_editor():
             return
 
         selected_item = selected_item[0]
-        selected_data = tree.item(selected_item)["values"]
+        selected_data = item_values[selected_item]
 
         # 各エントリフィールドにデータを入力
         for i, entry in enumerate(edit_entries):
@@ -137,6 +246,20 @@ def open_data_editor():
     tree = ttk.Treeview(window, columns=[], show="headings", selectmode="browse")
     tree.pack(fill="both", expand=True)
 
+    # ページ移動
+    page_frame = tk.Frame(window)
+    page_frame.pack(fill="x", padx=5, pady=5)
+    prev_page_button = tk.Button(page_frame, text="前のページ", command=lambda: show_page(page_start[0] - PAGE_SIZE))
+    prev_page_button.pack(side="left", padx=5)
+    page_label = tk.Label(page_frame, text="")
+    page_label.pack(side="left", padx=5)
+    next_page_button = tk.Button(page_frame, text="次のページ", command=lambda: show_page(page_start[0] + PAGE_SIZE))
+    next_page_button.pack(side="left", padx=5)
+    tk.Button(page_frame, text="行へ移動", command=jump_to_row).pack(side="right", padx=5)
+    jump_entry = tk.Entry(page_frame, width=8)
+    jump_entry.pack(side="right")
+    jump_entry.bind("<Return>", lambda event: jump_to_row())
+
     # CSV読み込み
     headers = load_csv_data()
     if headers:
@@ -144,6 +267,7 @@ def open_data_editor():
         for header in headers:
             tree.heading(header, text=header)
             tree.column(header, width=100)
+        show_page(0)
 
     # 行選択イベントを設定
     tree.bind("<<TreeviewSelect>>", on_row_select)
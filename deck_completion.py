@@ -0,0 +1,92 @@
+import heapq
+from bisect import bisect_left, insort
+import numpy as np
+from deck_names import DeckNameIndex, deck_index, normalize_name
+from match_table import full_table
+
+# 入力候補の重みが半分になるまでの記録数（最近使ったデッキほど上に出す）
+HALF_LIFE = 100
+DECAY = 0.5 ** (1 / HALF_LIFE)
+# 重みの基準を取り直す上限（浮動小数点のあふれを防ぐ）
+_MAX_BOOST = 1e100
+
+
+class DeckNameCompleter:
+    """
+    デッキ名の入力候補。正規化した名前のソート済み配列を bisect で引き、前方一致する名前を
+    出現回数と新しさ（記録ごとに DECAY 倍ずつ減衰する重み）の順に返す。
+    重みは「基準時点からの増幅率」で持ち、追加のたびに全体を減衰させずに済むようにする。
+    候補の名前は n-gram の索引にも登録し、新しい名前の保存時に似た既存の名前を提案できるようにする。
+    """
+
+    def __init__(self):
+        self._keys = []  # (正規化した名前, 名前) のソート済みリスト
+        self._weights = {}  # 名前 -> 重み（_boost 倍された値）
+        self._counts = {}  # 名前 -> 出現回数
+        self._boost = 1.0  # 次に追加する記録の重み
+        self._index = DeckNameIndex()  # 候補の名前の n-gram 索引（似た名前の提案用）
+
+    @classmethod
+    def from_names(cls, deck_names, ids, extra_names=()):
+        """
+        記録順のデッキ番号の配列から候補を作る。
+        :param deck_names: 番号 -> デッキ名
+        :param ids: 記録順に並んだデッキ番号
+        :param extra_names: 記録はないが候補に出す名前（別名表の正式名など）
+        """
+        completer = cls()
+        count = len(ids)
+        # 最後の記録の重みを 1 として、古い記録ほど DECAY 倍ずつ小さくする
+        weights = np.bincount(ids, weights=DECAY ** np.arange(count - 1, -1, -1.0), minlength=len(deck_names))
+        counts = np.bincount(ids, minlength=len(deck_names))
+        for i in np.flatnonzero(counts):
+            completer._insert(deck_names[i], float(weights[i]), int(counts[i]))
+        for name in extra_names:
+            if name not in completer._weights:
+                completer._insert(name, 0.0, 0)
+        return completer
+
+    def _insert(self, name, weight, count):
+        if name not in self._weights:
+            insort(self._keys, (normalize_name(name), name))
+            self._index.add(name)
+        self._weights[name] = weight
+        self._counts[name] = count
+
+    def add(self, name):
+        """保存された記録のデッキ名を候補に反映する"""
+        name = name.strip()
+        if not name:
+            return
+        self._boost /= DECAY
+        if self._boost > _MAX_BOOST:
+            # 増幅率が大きくなりすぎたら、全体を割り戻して基準を取り直す
+            for key in self._weights:
+                self._weights[key] /= self._boost
+            self._boost = 1.0
+        self._insert(name, self._weights.get(name, 0.0) + self._boost, self._counts.get(name, 0) + 1)
+
+    def suggest(self, text, limit=8):
+        """text で始まるデッキ名を、重みの大きい順に最大 limit 件返す（入力と同じ名前は除く）"""
+        prefix = normalize_name(text)
+        start = bisect_left(self._keys, (prefix,))
+        end = bisect_left(self._keys, (prefix + "\U0010ffff",))
+        names = [name for _, name in self._keys[start:end] if name != text.strip()]
+        return heapq.nlargest(limit, names, key=lambda name: (self._weights[name], self._counts[name]))
+
+    def similar(self, name, limit=3):
+        """name に似た候補の名前を返す（正規化後に一致する名前がある場合は空のリスト）"""
+        return self._index.similar(name, limit)
+
+
+def build_completers():
+    """
+    全履歴から使用デッキ・相手デッキの入力候補を作る。ワーカースレッドで実行される。
+    :return: {"deck": 使用デッキの候補, "opponent_deck": 相手デッキの候補}
+    """
+    table = full_table()
+    known_names = deck_index().canonical_names
+    return {
+        "deck": DeckNameCompleter.from_names(table.deck_names, table.deck, known_names),
+        "opponent_deck": DeckNameCompleter.from_names(table.deck_names, table.opponent_deck, known_names),
+    }
\ No newline at end of file
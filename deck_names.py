@@ -0,0 +1,154 @@
+import csv
+import os
+import threading
+import unicodedata
+from collections import Counter
+from record_store import CSV_ENCODING, file_signature
+
+# デッキ名の別名表（別名, 正式名）。表記ゆれや略称・英語名を正式名にまとめる
+ALIAS_FILE = "deck_aliases.csv"
+ALIAS_FIELDNAMES = ["alias", "canonical"]
+# 似た名前の提案に使う n-gram の長さと、似ているとみなす類似度（Dice係数）の下限
+NGRAM_SIZE = 3
+FUZZY_THRESHOLD = 0.7
+
+# 比較時に無視する文字（NFKC正規化後）
+_IGNORED_CHARS = str.maketrans("", "", " ・-_")
+# ひらがな -> カタカナ
+_HIRAGANA_TO_KATAKANA = {code: code + 0x60 for code in range(0x3041, 0x3097)}
+
+
+def normalize_name(name):
+    """
+    デッキ名を比較用の形に正規化する。
+    全角・半角の統一（NFKC）、英字の小文字化、ひらがなのカタカナ化をし、空白や中黒などを除く。
+    """
+    text = unicodedata.normalize("NFKC", name).casefold().translate(_HIRAGANA_TO_KATAKANA)
+    return text.translate(_IGNORED_CHARS)
+
+
+def ngrams(key):
+    """正規化した名前の n-gram の集合（前後に空白を補い、短い名前や先頭・末尾も比較できるようにする）"""
+    padded = f" {key} "
+    if len(padded) <= NGRAM_SIZE:
+        return {padded}
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+class DeckNameIndex:
+    """
+    正式名と別名を n-gram の転置索引で引けるようにしたデッキ名の辞書。
+    正式名への統一は正規化後の完全一致（別名表の別名を含む）だけで行い、一度解決した入力はそのまま覚えておく。
+    n-gram の類似度は似た名前の提案（similar）にだけ使う（混合デッキなど別のデッキを勝手にまとめない）。
+    """
+
+    def __init__(self, aliases=(), signature=None):
+        self.signature = signature  # 作成元の別名表の (mtime, size)
+        self.canonical_names = []
+        self._canonical_ids = {}  # 正式名 -> 番号
+        self._keys = {}  # 正規化した名前（正式名・別名） -> 正式名の番号
+        self._gram_counts = {}  # 正規化した名前 -> n-gram の数
+        self._postings = {}  # n-gram -> その n-gram を含む正規化した名前のリスト
+        self._resolved = {}  # 入力された名前 -> 正式名
+        self._lock = threading.Lock()
+        for alias, canonical in aliases:
+            self.add(canonical)
+            self.add(alias, canonical)
+
+    def add(self, name, canonical=None):
+        """名前を登録する。canonical を省略すると name 自身を正式名とする"""
+        canonical = (canonical or name).strip()
+        key = normalize_name(name)
+        if not canonical or not key:
+            return
+        with self._lock:
+            canonical_id = self._canonical_ids.setdefault(canonical, len(self._canonical_ids))
+            if canonical_id == len(self.canonical_names):
+                self.canonical_names.append(canonical)
+            if key in self._keys:
+                return
+            self._keys[key] = canonical_id
+            grams = ngrams(key)
+            self._gram_counts[key] = len(grams)
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(key)
+            self._resolved.clear()
+
+    def match(self, name):
+        """正規化後に完全一致する名前（正式名・別名）の正式名を返す。見つからない場合は None"""
+        key = normalize_name(name)
+        if key in self._keys:
+            return self.canonical_names[self._keys[key]]
+        return None
+
+    def similar(self, name, limit=3):
+        """
+        name に似た正式名を類似度の高い順に最大 limit 件返す（完全一致するものは除く）。
+        別名として登録するかをユーザーに確認するための候補で、自動ではまとめない。
+        """
+        key = normalize_name(name)
+        if not key or key in self._keys:
+            return []
+        # 入力と n-gram を共有する名前だけを候補にして類似度を求める
+        grams = ngrams(key)
+        shared = Counter(candidate for gram in grams for candidate in self._postings.get(gram, ()))
+        scores = {}
+        for candidate, count in shared.items():
+            score = 2 * count / (len(grams) + self._gram_counts[candidate])
+            canonical_id = self._keys[candidate]
+            if score >= FUZZY_THRESHOLD and score > scores.get(canonical_id, 0):
+                scores[canonical_id] = score
+        best = sorted(scores, key=lambda canonical_id: -scores[canonical_id])[:limit]
+        return [self.canonical_names[canonical_id] for canonical_id in best]
+
+    def canonicalize(self, name):
+        """正式名を返す。一致するものがなければ前後の空白を除いた入力をそのまま返す"""
+        resolved = self._resolved.get(name)
+        if resolved is None:
+            resolved = self.match(name) or name.strip()
+            with self._lock:
+                self._resolved[name] = resolved
+        return resolved
+
+
+def load_aliases(path=ALIAS_FILE):
+    """別名表を (別名, 正式名) のリストで読み込む。ファイルがなければ空のリスト"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding=CSV_ENCODING, newline="") as f:
+        return [(row["alias"], row["canonical"]) for row in csv.DictReader(f)
+                if (row.get("alias") or "").strip() and (row.get("canonical") or "").strip()]
+
+
+# 別名表から作った辞書と、読み込み時点の別名表の (mtime, size)
+_shared = {"signature": None, "index": None}
+_shared_lock = threading.Lock()
+
+
+def alias_signature(path=ALIAS_FILE):
+    """別名表の (mtime, size)。デッキ名の対応が変わったかの判定に使う"""
+    return file_signature(path)
+
+
+def deck_index(path=ALIAS_FILE):
+    """別名表から作った辞書を返す（別名表が変更されていれば作り直す）"""
+    with _shared_lock:
+        signature = alias_signature(path)
+        if _shared["index"] is None or signature != _shared["signature"]:
+            aliases = load_aliases(path)
+            signature = alias_signature(path)
+            _shared.update(signature=signature, index=DeckNameIndex(aliases, signature))
+        return _shared["index"]
+
+
+def add_alias(alias, canonical, path=ALIAS_FILE):
+    """
+    別名表に (別名, 正式名) を1行追記する（ファイルがなければ見出し行から作る）。
+    別名表が変わると全履歴の表や集計は作り直され、まとめた名前で数え直される。
+    """
+    file_exists = os.path.exists(path)
+    with open(path, "a", encoding=CSV_ENCODING, newline="") as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(ALIAS_FIELDNAMES)
+        writer.writerow([alias.strip(), canonical.strip()])
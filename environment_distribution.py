@@ -1,34 +1,62 @@
 import tkinter as tk
+from tkinter import messagebox
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
-from collections import Counter
+import matplotlib
+matplotlib.rc('font', family='Meiryo')
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from menu_functions_utils import read_csv_by_month, window_key
-import configparser
-import os
+from menu_functions_utils import window_key
+from monthly_rollup import month_opponent_deck_counts
+from background_tasks import LatestJobRunner
+from period_selector import create_period_selector
+from range_stats import range_opponent_deck_counts
+from settings_store import shared_settings
+from instrumentation import instrument_canvas, timed
 
-SETTINGS_FILE = "settings.ini"
 
-
-# 設定ファイルからグラフタイプ取得
+# 設定からグラフタイプ取得
 def load_graph_type():
-    if not os.path.exists(SETTINGS_FILE):
-        config = configparser.ConfigParser()
-        config["Settings"] = {"GraphType": "pie"}
-        with open(SETTINGS_FILE, "w") as f:
-            config.write(f)
-        return "pie"
-    config = configparser.ConfigParser()
-    config.read(SETTINGS_FILE)
-    return config["Settings"].get("GraphType", "pie")
-
-
-# 設定ファイルにグラフタイプ保存
+    return shared_settings.get("GraphType", "pie")
+
+
+# 設定にグラフタイプ保存（他のキーは変更しない）
 def save_graph_type(graph_type):
-    config = configparser.ConfigParser()
-    config["Settings"] = {"GraphType": graph_type}
-    with open(SETTINGS_FILE, "w") as f:
-        config.write(f)
+    shared_settings.set("GraphType", graph_type)
+
+
+def plot_environment(ax, drawn, month, deck_counts, graph_type):
+    """
+    集計結果で軸の中身を更新する（棒グラフは本数が同じなら既存の棒の高さだけ差し替える）。
+    キャンバスへの描画は呼び出し側で行う。
+    :param drawn: 現在描画されているグラフの種類と棒（{"kind": ..., "bars": ...}。更新する）
+    :param graph_type: "pie" または "bar"
+    """
+    labels = [deck for deck, _ in deck_counts]
+    sizes = [count for _, count in deck_counts]
+    kind = graph_type if deck_counts else "empty"
+
+    if kind == "bar" and drawn["kind"] == "bar" and len(drawn["bars"]) == len(sizes):
+        for bar, size in zip(drawn["bars"], sizes):
+            bar.set_height(size)
+        ax.set_xticklabels(labels, rotation=45, fontsize=8)
+        ax.relim()
+        ax.autoscale_view()
+    else:
+        # 種類や本数が変わった場合だけ軸の中身を作り直す（Figure と Axes は再利用）
+        ax.clear()
+        drawn["bars"] = None
+        if kind == "empty":
+            ax.text(0.5, 0.5, "データなし", fontsize=15, ha='center', va='center')
+        elif kind == "pie":
+            ax.pie(sizes, labels=labels, autopct="%1.1f%%", startangle=90)
+        elif kind == "bar":
+            drawn["bars"] = ax.bar(range(len(labels)), sizes)
+            ax.set_xticks(range(len(labels)))  # X軸の位置を設定
+            ax.set_xticklabels(labels, rotation=45, fontsize=8)
+            ax.set_ylabel("使用デッキ数")
+        drawn["kind"] = kind
+
+    ax.set_title(f"環境分布 ({month})")
 
 
 def show_environment_distribution():
@@ -42,6 +70,7 @@ def show_environment_distribution():
 
     def update_month_display(change):
         nonlocal selected_month
+        select_monthly()
         new_date = datetime.strptime(selected_month, '%Y/%m')
         if change == 0:
             new_date = datetime.today().replace(day=1)
@@ -58,27 +87,36 @@ def show_environment_distribution():
         prev_month_button.config(state="normal")
 
     def update_graph():
-        data = read_csv_by_month(selected_month)
-        figure.clear()
-        ax = figure.add_subplot(111)
-        if not data:
-            ax.text(0.5, 0.5, "データなし", fontsize=15, ha='center', va='center')
-            ax.set_title(f"環境分布 ({selected_month})")
+        """指定された月（または期間）の集計をワーカーで行い、完了後に描画する"""
+        try:
+            period = get_period()
+        except ValueError as e:
+            messagebox.showwarning("入力エラー", str(e))
+            return
+        if period is None:
+            month = selected_month
+            heading = f"現在の月: {month}"
+            job = lambda: month_opponent_deck_counts(month)
         else:
-            deck_counts = Counter(row["opponent_deck"] for row in data)
-            labels = list(deck_counts.keys())
-            sizes = list(deck_counts.values())
-
-            if graph_type_var.get() == "pie":
-                ax.pie(sizes, labels=labels, autopct="%1.1f%%", startangle=90)
-            elif graph_type_var.get() == "bar":
-                ax.bar(labels, sizes)
-                ax.set_xticks(range(len(labels)))  # X軸の位置を設定
-                ax.set_xticklabels(labels, rotation=45, fontsize=8)
-                ax.set_ylabel("使用デッキ数")
-
-            ax.set_title(f"環境分布 ({selected_month})")
-        canvas.draw()
+            # 期間の集計は日ごとの累積件数の差から求める
+            start, end, month = period
+            heading = f"期間: {month}"
+            job = lambda: range_opponent_deck_counts(start, end)
+        month_label.config(text=f"{heading} (読み込み中...)")
+        runner.submit(job, lambda counts: draw_graph(month, heading, counts), lambda e: show_error(heading, e),
+                      operation="environment_distribution.update_graph")
+
+    def show_error(heading, error):
+        """読み込み・集計に失敗した場合は表示を戻してエラーを知らせる"""
+        month_label.config(text=heading)
+        messagebox.showerror("エラー", f"データの読み込み中にエラーが発生しました: {error}")
+
+    @timed("environment_distribution.draw_graph", rows=None)
+    def draw_graph(month, heading, deck_counts):
+        """集計結果を描画（棒グラフは本数が同じなら既存の棒の高さだけ差し替える）"""
+        month_label.config(text=heading)
+        plot_environment(ax, drawn, month, deck_counts, graph_type_var.get())
+        canvas.draw_idle()
 
     def toggle_graph_type():
         """円グラフと棒グラフを切り替える"""
@@ -91,8 +129,9 @@ def show_environment_distribution():
     # 新しいウィンドウ作成
     window = tk.Toplevel()
     window.title("環境分布")
-    window.geometry("500x400")
+    window.geometry("500x430")
     window_key["environment_distribution"] = window
+    runner = LatestJobRunner(window)
 
     # 現在のグラフタイプを保持
     graph_type_var = tk.StringVar(value=graph_type)
@@ -100,10 +139,14 @@ def show_environment_distribution():
     selected_month = datetime.today().strftime('%Y/%m')
     month_label = tk.Label(window, text=f"現在の月: {selected_month}")
     month_label.pack()
+    get_period, select_monthly = create_period_selector(window, update_graph)
 
     figure = plt.Figure(figsize=(5, 3), dpi=100)
     canvas = FigureCanvasTkAgg(figure, master=window)
     canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    instrument_canvas(canvas, "environment_distribution.canvas.draw")
+    ax = figure.add_subplot(111)
+    drawn = {"kind": None, "bars": None}  # 現在描画されているグラフの種類と棒
 
     # トグルボタン
     toggle_button = tk.Button(window, text="表示切り替え (円⇔棒)", command=toggle_graph_type)
@@ -128,6 +171,7 @@ def show_environment_distribution():
     update_graph()
 
     def on_close():
+        runner.cancel()
         del window_key["environment_distribution"]
         window.destroy()
 
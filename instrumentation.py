@@ -0,0 +1,184 @@
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# 保持する計測結果の件数（古いものから捨てる）
+RING_SIZE = 2000
+# プロファイル結果の表示で、累積時間の多い順に出す関数の数
+PROFILE_TOP = 25
+
+# 計測結果 (処理名, 所要秒数, 行数または None) のリングバッファ
+_samples = deque(maxlen=RING_SIZE)
+_state = {
+    "enabled": False,
+    "profile_armed": False,  # 次の操作を cProfile で記録するか
+    "last_profile": None,  # 最後に保存したプロファイルのファイル名
+}
+_state_lock = threading.Lock()
+# スレッドごとの計測の入れ子の深さ（プロファイルは一番外側の処理だけで行う）
+_local = threading.local()
+
+
+def set_enabled(enabled):
+    """計測の有無を切り替える（無効の間は計測対象の処理にほぼ負荷をかけない）"""
+    _state["enabled"] = bool(enabled)
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def arm_profile():
+    """次に計測される操作1回分を cProfile で記録する（計測も有効にする）"""
+    _state["enabled"] = True
+    _state["profile_armed"] = True
+
+
+def last_profile():
+    """最後に保存したプロファイルのファイル名（まだなければ None）"""
+    return _state["last_profile"]
+
+
+def record(operation, seconds, rows=None):
+    """計測結果を1件追加する"""
+    _samples.append((operation, seconds, rows))
+
+
+def clear():
+    _samples.clear()
+
+
+def _take_profile():
+    """プロファイルの予約を1回分だけ取り出す"""
+    with _state_lock:
+        armed = _state["profile_armed"]
+        _state["profile_armed"] = False
+    return armed
+
+
+def _save_profile(operation, profile):
+    """プロファイルをファイルに保存し、累積時間の多い関数をコンソールに表示する"""
+    path = f"profile_{datetime.now():%Y%m%d_%H%M%S}_{operation.replace('.', '_')}.prof"
+    profile.dump_stats(path)
+    _state["last_profile"] = path
+    text = io.StringIO()
+    pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    print(f"プロファイル ({operation}): {path}\n{text.getvalue()}")
+
+
+class _Sample:
+    """measure の with 文で受け取る、行数を後から設定するためのオブジェクト"""
+    rows = None
+
+
+@contextmanager
+def measure(operation):
+    """
+    with 文の中の処理時間を operation の名前で記録する。
+    受け取ったオブジェクトの rows に処理した行数を入れると一緒に記録する。
+    プロファイルが予約されていれば、一番外側の計測1回分を cProfile で記録する。
+    """
+    sample = _Sample()
+    if not _state["enabled"]:
+        yield sample
+        return
+    depth = getattr(_local, "depth", 0)
+    profile = cProfile.Profile() if depth == 0 and _state["profile_armed"] and _take_profile() else None
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    if profile is not None:
+        profile.enable()
+    try:
+        yield sample
+    finally:
+        if profile is not None:
+            profile.disable()
+        record(operation, time.perf_counter() - start, sample.rows)
+        _local.depth = depth
+        if profile is not None:
+            _save_profile(operation, profile)
+
+
+def _count_rows(result):
+    """戻り値が記録のリストなら件数を返す"""
+    return len(result) if isinstance(result, list) else None
+
+
+def timed(operation, rows=_count_rows):
+    """
+    関数の処理時間を operation の名前で記録するデコレーター。
+    :param rows: 戻り値から行数を求める関数（既定ではリストの件数。None なら行数を記録しない）
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state["enabled"]:
+                return func(*args, **kwargs)
+            with measure(operation) as sample:
+                result = func(*args, **kwargs)
+                sample.rows = rows(result) if rows is not None else None
+            return result
+        return wrapper
+    return decorator
+
+
+def instrument_canvas(canvas, operation):
+    """matplotlib のキャンバスの描画（draw_idle から呼ばれるものを含む）の時間を記録する"""
+    canvas.draw = timed(operation, rows=None)(canvas.draw)
+
+
+def percentile(sorted_values, p):
+    """昇順に並んだ値の p パーセンタイル（最近傍順位法）"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, -(-len(sorted_values) * p // 100) - 1))
+    return sorted_values[int(rank)]
+
+
+def operation_stats():
+    """
+    処理名ごとの集計を、合計時間の多い順に返す。
+    :return: {"operation", "count", "p50_ms", "p95_ms", "max_ms", "total_ms", "rows"} のリスト（rows は行数の中央値）
+    """
+    grouped = {}
+    for operation, seconds, rows in list(_samples):
+        durations, row_counts = grouped.setdefault(operation, ([], []))
+        durations.append(seconds * 1000)
+        if rows is not None:
+            row_counts.append(rows)
+    stats = []
+    for operation, (durations, row_counts) in grouped.items():
+        durations.sort()
+        row_counts.sort()
+        stats.append({
+            "operation": operation,
+            "count": len(durations),
+            "p50_ms": percentile(durations, 50),
+            "p95_ms": percentile(durations, 95),
+            "max_ms": durations[-1],
+            "total_ms": sum(durations),
+            "rows": percentile(row_counts, 50),
+        })
+    stats.sort(key=lambda item: -item["total_ms"])
+    return stats
+
+
+def format_stats():
+    """処理名ごとの集計を表形式の文字列にする"""
+    lines = [f"{'処理':<40} {'回数':>6} {'p50(ms)':>10} {'p95(ms)':>10} {'最大(ms)':>10} {'行数':>8}"]
+    for item in operation_stats():
+        rows = "" if item["rows"] is None else item["rows"]
+        lines.append(f"{item['operation']:<40} {item['count']:>6} {item['p50_ms']:>10.2f} {item['p95_ms']:>10.2f} "
+                     f"{item['max_ms']:>10.2f} {rows:>8}")
+    return "\n".join(lines)
+
+
+def dump_stats():
+    """集計をコンソールに出力する"""
+    print(format_stats())
@@ -0,0 +1,76 @@
+import tkinter as tk
+from tkinter import messagebox
+import instrumentation
+from menu_functions_utils import window_key
+from settings_store import shared_settings
+
+# 集計の表示を更新する間隔（ミリ秒）
+REFRESH_INTERVAL = 1000
+
+
+def open_instrumentation_window():
+    """処理時間の計測ウィンドウを表示"""
+    if "instrumentation" in window_key:
+        window_key["instrumentation"].lift()
+        return
+
+    refresh_job = [None]  # 予約中の表示更新の after ID
+
+    def toggle_enabled():
+        """計測の有効・無効を切り替え、設定に保存する"""
+        instrumentation.set_enabled(enabled_var.get())
+        shared_settings.set("Instrumentation", "yes" if enabled_var.get() else "no")
+
+    def refresh():
+        """処理名ごとの集計を表示し直す"""
+        stats_text.config(state="normal")
+        stats_text.delete("1.0", tk.END)
+        stats_text.insert(tk.END, instrumentation.format_stats())
+        stats_text.config(state="disabled")
+        profile = instrumentation.last_profile()
+        profile_label.config(text=f"最後のプロファイル: {profile}" if profile else "")
+        refresh_job[0] = window.after(REFRESH_INTERVAL, refresh)
+
+    def profile_next():
+        """次に計測される操作1回分を cProfile で記録する"""
+        instrumentation.arm_profile()
+        enabled_var.set(True)
+        messagebox.showinfo("プロファイル", "次の操作をプロファイルします。結果はファイルとコンソールに出力されます。")
+
+    def reset():
+        """計測結果を消して表示し直す"""
+        instrumentation.clear()
+        window.after_cancel(refresh_job[0])
+        refresh()
+
+    # ウィンドウ作成
+    window = tk.Toplevel()
+    window.title("処理時間の計測")
+    window.geometry("760x420")
+    window_key["instrumentation"] = window
+
+    enabled_var = tk.BooleanVar(value=instrumentation.is_enabled())
+    tk.Checkbutton(window, text="計測を有効にする", variable=enabled_var, command=toggle_enabled).pack(
+        anchor="w", padx=10, pady=(10, 0))
+
+    # 集計の表示（等幅フォントで桁をそろえる）
+    stats_text = tk.Text(window, font=("Courier", 10), wrap="none", height=18)
+    stats_text.pack(fill="both", expand=True, padx=10, pady=5)
+    profile_label = tk.Label(window, text="", anchor="w")
+    profile_label.pack(fill="x", padx=10)
+
+    button_frame = tk.Frame(window)
+    button_frame.pack(pady=10)
+    tk.Button(button_frame, text="次の操作をプロファイル", command=profile_next).pack(side="left", padx=5)
+    tk.Button(button_frame, text="リセット", command=reset).pack(side="left", padx=5)
+    tk.Button(button_frame, text="コンソールに出力", command=instrumentation.dump_stats).pack(side="left", padx=5)
+
+    refresh()
+
+    # ウィンドウ終了時の処理
+    def on_close():
+        window.after_cancel(refresh_job[0])
+        del window_key["instrumentation"]
+        window.destroy()
+
+    window.protocol("WM_DELETE_WINDOW", on_close)
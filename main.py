@@ -1,17 +1,53 @@
+import startup_timing  # 起動時間の計測を最初に始める
+import importlib
+import queue
 import tkinter as tk
 from tkinter import messagebox
 from datetime import datetime
-import csv
-import os
 from data_editor import open_data_editor
-from settings_window import open_settings_window, load_settings
-from rate_graph import show_rate_graph
-from environment_distribution import show_environment_distribution
-from match_summary import show_match_summary
+from settings_window import open_settings_window
+from settings_store import shared_settings
+from storage import get_storage
+from append_journal import shared_journal
+from deck_names import add_alias, deck_index
+from autocomplete import attach_autocomplete
+from background_tasks import LatestJobRunner
+import instrumentation
+from instrumentation_window import open_instrumentation_window
+
+startup_timing.mark("モジュール読み込み")
+
+# 分析ウィンドウのモジュール（matplotlib・NumPy を読み込むため、起動時には読み込まない）
+ANALYSIS_MODULES = ["rate_graph", "environment_distribution", "match_summary", "matchup_heatmap"]
+# ジャーナルの反映の失敗を確認する間隔（ミリ秒）
+COMMIT_ERROR_POLL_MS = 500
+
+
+def analysis_command(module_name, function_name):
+    """分析ウィンドウを開くコマンドを返す。モジュールは初回の実行時に読み込む（読み込み済みならすぐ開く）"""
+    def command():
+        getattr(importlib.import_module(module_name), function_name)()
+    return command
+
+
+show_rate_graph = analysis_command("rate_graph", "show_rate_graph")
+show_environment_distribution = analysis_command("environment_distribution", "show_environment_distribution")
+show_match_summary = analysis_command("match_summary", "show_match_summary")
+show_matchup_heatmap = analysis_command("matchup_heatmap", "show_matchup_heatmap")
+
+
+def build_deck_completers():
+    """デッキ名の入力候補を作る（NumPy を含むため、入力画面の表示後にワーカーで読み込む）"""
+    from deck_completion import build_completers
+    return build_completers()
+
+
+def preload_analysis_modules():
+    """分析用のモジュールをワーカーで読み込んでおき、初回のメニュー操作を待たせないようにする"""
+    for module_name in ANALYSIS_MODULES:
+        importlib.import_module(module_name)
 
 
-# CSVファイル名
-CSV_FILE = "master_duel_records.csv"
 RANKS = [
     "R1", "B5", "B4", "B3", "B2", "B1",
     "S5", "S4", "S3", "S2", "S1",
@@ -21,7 +57,8 @@ RANKS = [
     "M5", "M4", "M3", "M2", "M1"
 ]
 
-settings = load_settings()
+# デッキ名の入力候補（起動後にワーカーで全履歴から作る）
+completers = {}
 # 起動時に開くウィンドウの処理
 
 
@@ -39,24 +76,36 @@ def create_menu(root):
     analysis_menu.add_command(label="レート/ランク推移を表示", command=show_rate_graph)
     analysis_menu.add_command(label="環境分布を見る", command=show_environment_distribution)
     analysis_menu.add_command(label="戦績をまとめる", command=show_match_summary)
+    analysis_menu.add_command(label="相性表を見る", command=show_matchup_heatmap)
     menubar.add_cascade(label="分析", menu=analysis_menu)
     root.config(menu=menubar)
     # 設定メニューの追加
     settings_menu = tk.Menu(menubar, tearoff=0)
     settings_menu.add_command(label="設定", command=open_settings_window)
+    settings_menu.add_command(label="処理時間の計測", command=open_instrumentation_window)
     menubar.add_cascade(label="設定", menu=settings_menu)
 
     # メニューバーに追加
 
 # 最後の記録をロードする関数
 def load_last_record():
-    if os.path.exists(CSV_FILE):
-        with open(CSV_FILE, "r", encoding="mbcs") as f:
-            reader = csv.DictReader(f)
-            records = list(reader)
-            if records:
-                return records[-1]
-    return None
+    # 未反映の記録がジャーナルにあればその最後の1件を使う（前回の反映が中断されていれば、ここで反映し直される）
+    pending = shared_journal.pending()
+    if pending:
+        return pending[-1]
+    # CSVは末尾から最後の1行だけ、SQLiteは索引で最後の1件だけを読む
+    return get_storage().last_record()
+
+# 新しいデッキ名が既存の名前と似ていれば、別名として登録するかを確認する
+def confirm_alias(name, completer):
+    if completer is None or deck_index().match(name) is not None:
+        return
+    for candidate in completer.similar(name, limit=1):
+        if messagebox.askyesno("デッキ名の確認",
+                               f"「{name}」は記録済みの「{candidate}」と似ています。\n"
+                               f"「{candidate}」の別名として登録し、集計でまとめますか？\n"
+                               "（記録には入力したデッキ名のまま保存されます）"):
+            add_alias(name, candidate)
 
 # 新しい記録をCSVに保存する関数
 def save_record():
@@ -81,8 +130,12 @@ def save_record():
         messagebox.showerror("入力エラー", "戦績を選択してください。")
         return
 
+    # デッキ名は入力のまま保存する（正式名へは集計時に別名表で揃える）
+    deck = deck_entry.get().strip()
     # 空欄時のデフォルト値セット
     opponent_deck = opponent_entry.get().strip() or "不明"
+    confirm_alias(deck, completers.get("deck"))
+    confirm_alias(opponent_deck, completers.get("opponent_deck"))
     # レートの処理（未入力の場合はデフォルトで 0）
     rate = rate_var.get().strip()
     rate = int(rate) if rate.isdigit() else 0  # 未入力または不正入力なら 0 に設定
@@ -90,7 +143,7 @@ def save_record():
     # レコード作成
     record = {
         "date": date_entry.get(),
-        "deck": deck_entry.get(),
+        "deck": deck,
         "coin": coin_var.get(),
         "turn": turn_var.get(),
         "opponent_deck": opponent_deck,
@@ -100,14 +153,13 @@ def save_record():
         "memo": memo_entry.get("1.0", "end-1c"),
     }
 
-    # データをCSVに保存
+    # データをジャーナルに書き込む（保存先にはグループコミットでまとめて反映される）
     try:
-        file_exists = os.path.exists(CSV_FILE)
-        with open(CSV_FILE, "a", encoding="mbcs", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=record.keys())
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(record)
+        shared_journal.append(record)
+        # 入力候補にも反映する（候補の作成前なら、作成時に履歴から読み込まれる）
+        if completers:
+            completers["deck"].add(deck)
+            completers["opponent_deck"].add(opponent_deck)
 
         # 保存後のリセット操作
         opponent_entry.delete(0, tk.END)  # 相手デッキフィールドを空にする
@@ -157,9 +209,39 @@ def on_close():
     try:
         # 必要なリソースの解放（例: ウィンドウやファイルのクローズ）
         print("アプリケーションを終了します...")
-        root.destroy()  # メインウィンドウを正常に閉じる
+        shared_journal.commit()  # ジャーナルの未反映の記録を保存先に書き込む
+        from match_table import flush_history_sidecar
+        flush_history_sidecar()  # 追記分をサイドカーに反映しておく
+        if instrumentation.is_enabled():
+            instrumentation.dump_stats()  # 計測結果の集計を残しておく
     except Exception as e:
         print(f"エラーが発生しました: {e}")
+        messagebox.showwarning("保存エラー", f"記録を保存先に書き込めませんでした: {e}\n"
+                                         "未反映の記録はジャーナルに残っており、次回の起動時に書き込まれます。")
+    finally:
+        root.destroy()  # 保存に失敗してもメインウィンドウは閉じる
+
+# ジャーナルの反映の失敗（反映のタイマーのスレッドから渡され、画面のスレッドで表示する）
+commit_errors = queue.Queue()
+
+def report_commit_error(error):
+    """ジャーナルの反映の失敗を受け取る（タイマーのスレッドから呼ばれるため、画面は操作しない）"""
+    commit_errors.put(error)
+
+def show_commit_errors():
+    """受け取った反映の失敗を表示する（画面のスレッドで定期的に呼ぶ）"""
+    try:
+        while True:
+            error = commit_errors.get_nowait()
+            messagebox.showerror("保存エラー", f"記録を保存先に書き込めませんでした: {error}\n"
+                                             "記録はジャーナルに残っており、書き込めるようになり次第保存されます。"
+                                             "CSVファイルを他のアプリで開いている場合は閉じてください。")
+    except queue.Empty:
+        pass
+    root.after(COMMIT_ERROR_POLL_MS, show_commit_errors)
+
+# 処理時間の計測（設定で有効にしたときだけ行う）
+instrumentation.set_enabled(shared_settings.get("Instrumentation", "no") == "yes")
 
 # GUI作成
 root = tk.Tk()
@@ -172,9 +254,11 @@ create_menu(root)
 
 # メインウィンドウの終了イベントを設定
 root.protocol("WM_DELETE_WINDOW", on_close)
+shared_journal.on_error = report_commit_error
+root.after(COMMIT_ERROR_POLL_MS, show_commit_errors)
 
 # 起動時に開くウィンドウの処理
-startup_windows = settings["Settings"].get("StartupWindow", "").split(",")
+startup_windows = shared_settings.get("StartupWindow", "").split(",")
 
 if "RateGraph" in startup_windows:
     show_rate_graph()
@@ -257,6 +341,36 @@ memo_entry.grid(row=8, column=2, columnspan=4, sticky="nsew", pady=5, padx=(0, 1
 save_button = tk.Button(root, text="保存", command=save_record)
 save_button.grid(row=9, column=0, columnspan=6, sticky="nsew", pady=5, padx=(10, 10))  # 左右のスペースを追加
 
+# デッキ名の入力候補（作成が終わるまでは候補を出さない）
+attach_autocomplete(deck_entry, lambda: completers.get("deck"))
+attach_autocomplete(opponent_entry, lambda: completers.get("opponent_deck"))
+completion_runner = LatestJobRunner(root)
+preload_runner = LatestJobRunner(root)
+startup_timing.mark("画面の作成")
+
+
+def on_first_idle():
+    """入力画面が表示された後に、候補の作成と分析機能の読み込みをワーカーで始める"""
+    startup_timing.mark("入力画面の表示")
+
+    def on_completers_ready(result):
+        completers.update(result)
+        startup_timing.mark("入力候補の準備")
+
+    def on_preloaded(result):
+        startup_timing.mark("分析機能の読み込み")
+        if instrumentation.is_enabled():
+            startup_timing.print_report()  # 処理時間の計測を有効にしている場合だけ出力する
+
+    # どちらも失敗しても入力・保存はできる（候補は出さず、分析機能は開くときに読み込む）
+    completion_runner.submit(build_deck_completers, on_completers_ready,
+                             lambda e: print(f"入力候補を作成できませんでした: {e}"))
+    preload_runner.submit(preload_analysis_modules, on_preloaded,
+                          lambda e: print(f"分析機能を読み込めませんでした: {e}"))
+
+
+root.after_idle(on_first_idle)
+
 try:
     # メインループの実行
     root.mainloop()
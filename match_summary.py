@@ -1,6 +1,13 @@
 import tkinter as tk
+from tkinter import messagebox
 from datetime import datetime, timedelta
-from menu_functions_utils import read_csv_by_month, window_key
+from menu_functions_utils import window_key
+from background_tasks import LatestJobRunner
+from period_selector import create_period_selector
+from range_stats import range_summary
+from online_stats import month_summary
+from confidence import CONFIDENCE_LEVEL, format_rate
+
 
 def show_match_summary():
     """戦績の集計結果を表示"""
@@ -11,6 +18,7 @@ def show_match_summary():
     def update_month_display(change):
         """月を変更し、データを更新"""
         nonlocal selected_month
+        select_monthly()
         new_date = datetime.strptime(selected_month, '%Y/%m')
 
         if change == 0:  # 現在の月にリセット
@@ -32,56 +40,68 @@ def show_match_summary():
         prev_month_button.config(state="normal")
 
     def summarize_data():
-        """指定された月の戦績を要約"""
-        data = read_csv_by_month(selected_month)
-        if not data:
+        """指定された月（または期間）の戦績をワーカーで集計し、完了後に表示する"""
+        try:
+            period = get_period()
+        except ValueError as e:
+            messagebox.showwarning("入力エラー", str(e))
+            return
+        result_label.config(text="読み込み中...")
+        if period is None:
+            month = selected_month
+            month_label.config(text=f"現在の月: {month}")
+            # 月の集計は記録の保存・編集時に更新される月別集計を使う
+            runner.submit(lambda: month_summary(month), lambda stats: show_summary(stats, "月間"), show_error,
+                          operation="match_summary.summarize_data")
+        else:
+            # 期間の集計は日ごとの累積件数の差から求める
+            start, end, label = period
+            month_label.config(text=f"期間: {label}")
+            runner.submit(lambda: range_summary(start, end), lambda stats: show_summary(stats, "期間"), show_error,
+                          operation="match_summary.summarize_data")
+
+    def show_error(error):
+        """集計に失敗した場合は「読み込み中」の表示を消してエラーを知らせる"""
+        result_label.config(text="")
+        messagebox.showerror("エラー", f"データの読み込み中にエラーが発生しました: {error}")
+
+    def show_summary(stats, prefix):
+        """集計結果を表示"""
+        if stats is None:
             result_label.config(text="データなし")
             return
 
-        # 戦績データを集計
-        total_matches = len(data)
-        win_count = sum(1 for row in data if row["result"] == "勝")
-        heads_count = sum(1 for row in data if row["coin"] == "表")
-        tails_count = total_matches - heads_count
-        first_turn_count = sum(1 for row in data if row["turn"] == "先攻")
-
-        win_rate = (win_count / total_matches) * 100 if total_matches else 0
-        heads_rate = (heads_count / total_matches) * 100 if total_matches else 0
-        first_turn_rate = (first_turn_count / total_matches) * 100 if total_matches else 0
-
-        heads_win_count = sum(1 for row in data if row["coin"] == "表" and row["result"] == "勝")
-        tails_win_count = sum(1 for row in data if row["coin"] == "裏" and row["result"] == "勝")
-        heads_win_rate = (heads_win_count / heads_count) * 100 if heads_count else 0
-        tails_win_rate = (tails_win_count / tails_count) * 100 if tails_count else 0
-
-        heads_first_turn_count = sum(1 for row in data if row["coin"] == "表" and row["turn"] == "先攻")
-        tails_first_turn_count = sum(1 for row in data if row["coin"] == "裏" and row["turn"] == "先攻")
-        heads_first_turn_rate = (heads_first_turn_count / heads_count) * 100 if heads_count else 0
-        tails_first_turn_rate = (tails_first_turn_count / tails_count) * 100 if tails_count else 0
-
-        # 集計結果を表示用の文字列に変換
+        # 集計結果を表示用の文字列に変換（各比率に信頼区間と母数を添える）
         summary = (
-            f"月間対戦数: {total_matches}\n"
-            f"月間勝率: {win_rate:.2f}%\n"
-            f"コイン表率: {heads_rate:.2f}%\n"
-            f"先攻率: {first_turn_rate:.2f}%\n"
-            f"コイン表時勝率: {heads_win_rate:.2f}%\n"
-            f"コイン裏時勝率: {tails_win_rate:.2f}%\n"
-            f"コイン表時先攻率: {heads_first_turn_rate:.2f}%\n"
-            f"コイン裏時先攻率: {tails_first_turn_rate:.2f}%"
+            f"{prefix}対戦数: {stats['total_matches']}\n"
+            f"{prefix}勝率: {format_rate(stats, 'win_rate')}\n"
+            f"コイン表率: {format_rate(stats, 'heads_rate')}\n"
+            f"先攻率: {format_rate(stats, 'first_turn_rate')}\n"
+            f"先攻時勝率: {format_rate(stats, 'first_turn_win_rate')}\n"
+            f"後攻時勝率: {format_rate(stats, 'second_turn_win_rate')}\n"
+            f"コイン表時勝率: {format_rate(stats, 'heads_win_rate')}\n"
+            f"コイン裏時勝率: {format_rate(stats, 'tails_win_rate')}\n"
+            f"コイン表時先攻率: {format_rate(stats, 'heads_first_turn_rate')}\n"
+            f"コイン裏時先攻率: {format_rate(stats, 'tails_first_turn_rate')}\n"
+            f"（括弧内は{CONFIDENCE_LEVEL}%信頼区間と母数）"
         )
+        if stats.get("rate_last") is not None:
+            # 月別集計にはレートの最小・最大・最後の値も含まれる
+            summary += f"\nレート: 最終 {stats['rate_last']}（最高 {stats['rate_max']} / 最低 {stats['rate_min']}）"
         result_label.config(text=summary)
 
     # ウィンドウ作成
     window = tk.Toplevel()
     window.title("戦績まとめ")
-    window.geometry("400x300")
+    window.geometry("480x380")
     window_key["match_summary"] = window
+    runner = LatestJobRunner(window)
 
     # 選択された月を管理
     selected_month = datetime.today().strftime('%Y/%m')
     month_label = tk.Label(window, text=f"現在の月: {selected_month}")
     month_label.pack()
+    get_period, select_monthly = create_period_selector(window, summarize_data)
 
     # 結果表示用ラベル
     result_label = tk.Label(window, text="", justify="left", anchor="w")
@@ -108,6 +128,7 @@ def show_match_summary():
 
     # ウィンドウ終了時の処理
     def on_close():
+        runner.cancel()
         del window_key["match_summary"]
         window.destroy()
 
@@ -0,0 +1,355 @@
+import threading
+import numpy as np
+from record_store import (CSV_FILE, file_signature, is_appended, month_key, month_number, parse_date, read_csv_rows,
+                          TAIL_MARKER_SIZE)
+from sidecar_cache import load_sidecar, save_sidecar
+from deck_names import deck_index
+from confidence import rate_intervals
+from instrumentation import timed
+from storage import CsvStorage, SqliteStorage, get_analysis_storage
+
+RANKS = [
+    "R1", "B5", "B4", "B3", "B2", "B1",
+    "S5", "S4", "S3", "S2", "S1",
+    "G5", "G4", "G3", "G2", "G1",
+    "P5", "P4", "P3", "P2", "P1",
+    "D5", "D4", "D3", "D2", "D1",
+    "M5", "M4", "M3", "M2", "M1"
+]
+RANK_INDEX = {rank: i for i, rank in enumerate(RANKS)}
+
+# 文字列の列を小さな整数に変換する対応表（該当なしは -1）
+RESULT_CODES = {"勝": 1, "敗": 0}
+COIN_CODES = {"表": 1, "裏": 0}
+TURN_CODES = {"先攻": 1, "後攻": 0}
+
+
+# 配列として保存・復元する列
+COLUMNS = ("day", "month", "result", "coin", "turn", "rate", "rank", "deck", "opponent_deck")
+
+
+def _day_number(date_text):
+    """日付文字列を日の通し番号（date.toordinal）に変換する。解釈できない場合は -1"""
+    day = parse_date(date_text)
+    return day.toordinal() if day is not None else -1
+
+
+def _parse_rate(text):
+    text = text.strip()
+    return int(text) if text.isdigit() else 0
+
+
+class MatchTable:
+    """
+    戦績を列ごとのNumPy配列で保持する表。
+    勝敗・コイン・先後は int8 (1/0/-1)、レートは int32、ランクは RANKS の添字、
+    デッキ名は別名表で正式名に揃えたうえで、deck_names への添字として辞書エンコードする。
+    day は date.toordinal() による日の通し番号、month は month_number() による年月の通し番号
+    （いずれも日付を解釈できない行は -1）。
+    lineage は extend で末尾に行を足しただけの表どうしで共有される目印
+    （同じ lineage の表は、短い方の行がすべて長い方の先頭に同じ順で含まれる）。
+    """
+
+    def __init__(self, day, month, result, coin, turn, rate, rank, deck, opponent_deck, deck_names, lineage=None):
+        self.day = day
+        self.month = month
+        self.result = result
+        self.coin = coin
+        self.turn = turn
+        self.rate = rate
+        self.rank = rank
+        self.deck = deck
+        self.opponent_deck = opponent_deck
+        self.deck_names = deck_names
+        self.lineage = lineage if lineage is not None else object()
+        self._month_indices = {}  # 月の通し番号 -> 行番号の配列
+
+    def __len__(self):
+        return len(self.result)
+
+    @classmethod
+    @timed("match_table.from_rows", rows=len)
+    def from_rows(cls, rows, names=None):
+        """
+        DictReader形式の行リストから表を作る
+        :param names: デッキ名を正式名に揃える DeckNameIndex（省略時は現在の別名表から作ったもの）
+        """
+        canonicalize = (names or deck_index()).canonicalize
+        deck_ids = {}
+
+        def encode_deck(name):
+            return deck_ids.setdefault(canonicalize(name), len(deck_ids))
+
+        def column(values, dtype):
+            return np.fromiter(values, dtype=dtype, count=len(rows))
+
+        table = cls(
+            day=column((_day_number(row.get("date") or "") for row in rows), np.int32),
+            month=column((month_number(month_key(row.get("date") or "")) for row in rows), np.int32),
+            result=column((RESULT_CODES.get(row["result"], -1) for row in rows), np.int8),
+            coin=column((COIN_CODES.get(row["coin"], -1) for row in rows), np.int8),
+            turn=column((TURN_CODES.get(row["turn"], -1) for row in rows), np.int8),
+            rate=column((_parse_rate(row.get("rate") or "") for row in rows), np.int32),
+            rank=column((RANK_INDEX.get(row.get("rank"), -1) for row in rows), np.int8),
+            deck=column((encode_deck(row["deck"]) for row in rows), np.int32),
+            opponent_deck=column((encode_deck(row["opponent_deck"]) for row in rows), np.int32),
+            deck_names=list(deck_ids),
+        )
+        return table
+
+    @classmethod
+    def from_arrays(cls, arrays, deck_names, lineage=None):
+        """列名 -> 配列 の辞書から表を作る"""
+        return cls(deck_names=list(deck_names), lineage=lineage, **{name: arrays[name] for name in COLUMNS})
+
+    def to_arrays(self):
+        """列名 -> 配列 の辞書を返す"""
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def take(self, indices):
+        """指定した行だけを持つ表を返す（デッキ名の対応表は共有する）"""
+        return MatchTable.from_arrays({name: column[indices] for name, column in self.to_arrays().items()},
+                                      self.deck_names)
+
+    def month_indices(self, number):
+        """指定した月の通し番号に該当する行番号を返す"""
+        if number not in self._month_indices:
+            self._month_indices[number] = np.flatnonzero(self.month == number)
+        return self._month_indices[number]
+
+    def extend(self, other):
+        """other の行を末尾に連結した新しい表を返す（列はすべてコピーするため、行数に比例する時間がかかる）"""
+        deck_ids = {name: i for i, name in enumerate(self.deck_names)}
+        remap = np.array([deck_ids.setdefault(name, len(deck_ids)) for name in other.deck_names],
+                         dtype=np.int32)
+        arrays = {}
+        for name in COLUMNS:
+            column = getattr(other, name)
+            if name in ("deck", "opponent_deck") and len(column):
+                column = remap[column]
+            arrays[name] = np.concatenate([getattr(self, name), column.astype(getattr(self, name).dtype)])
+        return MatchTable.from_arrays(arrays, list(deck_ids), lineage=self.lineage)
+
+
+def opponent_deck_counts(table):
+    """相手デッキごとの対戦数を、月内で最初に現れた順の (デッキ名, 件数) のリストで返す"""
+    ids, first_index, counts = np.unique(table.opponent_deck, return_index=True, return_counts=True)
+    order = np.argsort(first_index)
+    return [(table.deck_names[ids[i]], int(counts[i])) for i in order]
+
+
+def combination_codes(table, indices=None):
+    """
+    各行のコイン(不明/裏/表)×勝敗×先後の組み合わせ番号（0～11）: (コイン+1)*4 + 勝ち*2 + 先攻
+    :param indices: 指定した行だけの番号を求める場合の行番号
+    """
+    coin, result, turn = (table.coin, table.result, table.turn) if indices is None else \
+        (table.coin[indices], table.result[indices], table.turn[indices])
+    return (coin.astype(np.intp) + 1) * 4 + (result == 1) * 2 + (turn == 1)
+
+
+def summarize_table(table):
+    """
+    戦績の集計値を返す。
+    コイン×勝敗×先後の組み合わせを1回のbincountで数え、各比率を求める。
+    """
+    return summarize_counts(np.bincount(combination_codes(table), minlength=12))
+
+
+def summarize_counts(combination_counts):
+    """
+    組み合わせ番号ごとの件数（長さ12）から集計値を求める。
+    "intervals" には各比率の信頼区間（confidence.rate_intervals）を入れる。
+    """
+    counts = np.asarray(combination_counts).reshape(3, 2, 2)  # [コイン, 勝敗, 先後]
+    total = int(counts.sum())
+
+    win_count = int(counts[:, 1, :].sum())
+    heads_count = int(counts[2].sum())
+    tails_count = total - heads_count
+    first_turn_count = int(counts[:, :, 1].sum())
+    heads_win_count = int(counts[2, 1, :].sum())
+    tails_win_count = int(counts[1, 1, :].sum())
+    heads_first_turn_count = int(counts[2, :, 1].sum())
+    tails_first_turn_count = int(counts[1, :, 1].sum())
+    first_turn_win_count = int(counts[:, 1, 1].sum())
+    second_turn_count = total - first_turn_count
+    second_turn_win_count = win_count - first_turn_win_count
+
+    def rate(count, base):
+        return (count / base) * 100 if base else 0
+
+    stats = {
+        "total_matches": total,
+        "win_count": win_count,
+        "heads_count": heads_count,
+        "tails_count": tails_count,
+        "first_turn_count": first_turn_count,
+        "heads_win_count": heads_win_count,
+        "tails_win_count": tails_win_count,
+        "heads_first_turn_count": heads_first_turn_count,
+        "tails_first_turn_count": tails_first_turn_count,
+        "second_turn_count": second_turn_count,
+        "first_turn_win_count": first_turn_win_count,
+        "second_turn_win_count": second_turn_win_count,
+        "win_rate": rate(win_count, total),
+        "heads_rate": rate(heads_count, total),
+        "first_turn_rate": rate(first_turn_count, total),
+        "heads_win_rate": rate(heads_win_count, heads_count),
+        "tails_win_rate": rate(tails_win_count, tails_count),
+        "heads_first_turn_rate": rate(heads_first_turn_count, heads_count),
+        "tails_first_turn_rate": rate(tails_first_turn_count, tails_count),
+        "first_turn_win_rate": rate(first_turn_win_count, first_turn_count),
+        "second_turn_win_rate": rate(second_turn_win_count, second_turn_count),
+    }
+    stats["intervals"] = rate_intervals(stats)
+    return stats
+
+
+# 全履歴の表と、その元になったCSVの解析状態
+_history = {
+    "table": None,
+    "signature": None,  # 解析時点の (mtime, size)
+    "fieldnames": [],
+    "offset": 0,  # 解析済みのバイト位置
+    "tail_marker": b"",  # 解析済み部分の末尾バイト列
+    "dirty": False,  # サイドカーに未保存の追記があるか
+    "aliases": None,  # デッキ名を揃えたときの別名表の (mtime, size)
+}
+# 分析用スレッドと画面側のスレッドの両方から使うためのロック
+_history_lock = threading.RLock()
+
+
+def _restore_from_sidecar(path, aliases):
+    """サイドカーから全履歴の表と解析状態を復元する。使えない場合（別名表が変わった場合を含む）は False"""
+    cached = load_sidecar(path)
+    if cached is None:
+        return False
+    arrays, deck_names, meta = cached
+    if meta.get("aliases") != (list(aliases) if aliases else None):
+        return False
+    try:
+        table = MatchTable.from_arrays(arrays, deck_names)
+        _history.update(
+            table=table,
+            signature=(meta["mtime_ns"], meta["size"]),
+            fieldnames=meta["fieldnames"],
+            offset=meta["offset"],
+            tail_marker=bytes.fromhex(meta["tail_marker"]),
+            aliases=aliases,
+        )
+    except (KeyError, TypeError, ValueError):
+        return False
+    return True
+
+
+def _write_sidecar(path):
+    """現在の全履歴の表をサイドカーに書き出す"""
+    save_sidecar(path, _history["table"].to_arrays(), _history["table"].deck_names, {
+        "mtime_ns": _history["signature"][0],
+        "size": _history["signature"][1],
+        "fieldnames": _history["fieldnames"],
+        "offset": _history["offset"],
+        "tail_marker": _history["tail_marker"].hex(),
+        "aliases": list(_history["aliases"]) if _history["aliases"] else None,
+    })
+    _history["dirty"] = False
+
+
+def history_table(path=CSV_FILE):
+    """
+    全履歴の MatchTable を返す。
+    起動直後はサイドカーから復元し、CSVが追記だけされていれば末尾のみ解析して連結する。
+    それ以外の変更があった場合はCSV全体から作り直し、サイドカーも更新する。
+    """
+    with _history_lock:
+        return _update_history_table(path)
+
+
+def _update_history_table(path):
+    names = deck_index()
+    if _history["table"] is not None and _history["aliases"] != names.signature:
+        # 別名表が変わった場合はデッキ名の対応が変わるため作り直す
+        _history.update(table=None, signature=None)
+    signature = file_signature(path)
+    if signature is None:
+        return MatchTable.from_rows([], names)
+    if signature == _history["signature"]:
+        return _history["table"]
+
+    cold_start = _history["table"] is None
+    if cold_start and _restore_from_sidecar(path, names.signature) and signature == _history["signature"]:
+        return _history["table"]
+
+    with open(path, "rb") as f:
+        if _history["table"] is not None and _history["fieldnames"] and \
+                is_appended(f, signature[1], _history["offset"], _history["tail_marker"]):
+            _, rows, offset, tail = read_csv_rows(f, _history["offset"], _history["fieldnames"])
+            _history["table"] = _history["table"].extend(MatchTable.from_rows(rows, names))
+            _history["tail_marker"] = (_history["tail_marker"] + tail)[-TAIL_MARKER_SIZE:]
+            rebuilt = False
+        else:
+            fieldnames, rows, offset, tail = read_csv_rows(f)
+            _history["table"] = MatchTable.from_rows(rows, names)
+            _history["fieldnames"] = fieldnames
+            _history["tail_marker"] = tail
+            rebuilt = True
+    _history["offset"] = offset
+    _history["signature"] = signature
+    _history["aliases"] = names.signature
+
+    if rebuilt or cold_start:
+        _write_sidecar(path)
+    else:
+        # 記録の保存ごとに書き出さず、終了時にまとめて保存する
+        _history["dirty"] = True
+    return _history["table"]
+
+
+def flush_history_sidecar(path=CSV_FILE):
+    """未保存の追記があればサイドカーを書き出す"""
+    with _history_lock:
+        if _history["dirty"] and _history["table"] is not None:
+            _write_sidecar(path)
+
+
+# SQLite・複数の記録ファイル使用時の全履歴の表と、作成時点の保存先・書き込みバージョン
+_sqlite_history = {"storage": None, "version": None, "rewrite_version": None, "aliases": None, "table": None}
+
+
+def full_table():
+    """集計に使う保存先（storage.get_analysis_storage）の全履歴の MatchTable を返す"""
+    storage = get_analysis_storage()
+    if isinstance(storage, CsvStorage):
+        return history_table(storage.path)
+    names = deck_index()
+    with _history_lock:
+        same_source = _sqlite_history["storage"] is storage and _sqlite_history["aliases"] == names.signature
+        if same_source and _sqlite_history["version"] == storage.version:
+            return _sqlite_history["table"]
+        # 読み込み前の版を記録しておき、読み込み中に書き込まれても次回に取り込まれるようにする
+        version, rewrite_version = storage.version, storage.rewrite_version
+        if same_source and _sqlite_history["rewrite_version"] == rewrite_version:
+            # 追記だけされた場合は、増えた行だけを読んで連結する
+            table = _sqlite_history["table"]
+            rows = [row for _, row in storage.rows_slice(len(table), -1)]
+            table = table.extend(MatchTable.from_rows(rows, names))
+        else:
+            table = MatchTable.from_rows(storage.get_rows(), names)
+        _sqlite_history.update(storage=storage, version=version, rewrite_version=rewrite_version,
+                               aliases=names.signature, table=table)
+        return table
+
+
+def month_table(month):
+    """
+    指定された月の MatchTable を返す。
+    :param month: 文字列形式（例：'2023/10'）または (年, 月) のタプル
+    """
+    storage = get_analysis_storage()
+    if isinstance(storage, SqliteStorage):
+        # SQLiteの場合は月の索引で取り出した行だけを変換する
+        return MatchTable.from_rows(storage.rows_by_month(month))
+    table = full_table()
+    number = month_number(month if isinstance(month, tuple) else month_key(month))
+    return table.take(table.month_indices(number))
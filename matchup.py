@@ -0,0 +1,120 @@
+import numpy as np
+from match_table import combination_codes, summarize_counts
+from period_cache import PeriodCache
+from record_store import month_key, month_number
+
+
+class MatchupMatrix:
+    """
+    使用デッキ×相手デッキの相性表。
+    各マスにコイン×勝敗×先後の組み合わせ番号（combination_codes）ごとの件数を持つ
+    int32 の密な配列 counts[使用デッキ, 相手デッキ, 組み合わせ番号] で、
+    1マス分（長さ12）を summarize_counts に渡せば先後・コイン別の集計が得られる。
+    行・列には対象期間に現れたデッキだけを、現れた順に並べる。
+    """
+
+    def __init__(self, decks=(), opponent_decks=(), counts=None):
+        self.decks = list(decks)
+        self.opponent_decks = list(opponent_decks)
+        self.counts = counts if counts is not None else np.zeros((0, 0, 12), dtype=np.int32)
+        self._deck_index = {name: i for i, name in enumerate(self.decks)}
+        self._opponent_index = {name: i for i, name in enumerate(self.opponent_decks)}
+        self._deck_stats = None
+
+    @classmethod
+    def from_table(cls, table, indices=None):
+        """表の指定した行（省略時は全行）から相性表を作る"""
+        return cls().added(table, indices)
+
+    def added(self, table, indices=None):
+        """
+        表の指定した行を足した新しい相性表を返す（自身は変更しない）。
+        記録の追記時は、追記された行だけを足せばよい。
+        """
+        if indices is None:
+            indices = np.arange(len(table))
+        if not len(indices):
+            return self
+        deck_index = dict(self._deck_index)
+        opponent_index = dict(self._opponent_index)
+        rows = self._positions(table.deck[indices], table.deck_names, deck_index)
+        columns = self._positions(table.opponent_deck[indices], table.deck_names, opponent_index)
+
+        # 新しいデッキが現れた分だけ配列を広げ、追加分を1回のbincountで数える
+        shape = (len(deck_index), len(opponent_index), 12)
+        counts = np.zeros(shape, dtype=np.int32)
+        counts[:self.counts.shape[0], :self.counts.shape[1]] = self.counts
+        cells = (rows * shape[1] + columns) * 12 + combination_codes(table, indices)
+        counts += np.bincount(cells, minlength=counts.size).reshape(shape).astype(np.int32)
+        return MatchupMatrix(deck_index, opponent_index, counts)
+
+    @staticmethod
+    def _positions(codes, deck_names, index):
+        """デッキ名の添字を相性表の行（列）番号に変換する（新しいデッキは index の末尾に足す）"""
+        unique_codes, inverse = np.unique(codes, return_inverse=True)
+        positions = np.array([index.setdefault(deck_names[code], len(index)) for code in unique_codes],
+                             dtype=np.intp)
+        return positions[inverse]
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def games(self):
+        """各マスの対戦数"""
+        return self.counts.sum(axis=2)
+
+    def wins(self):
+        """各マスの勝ち数"""
+        return self.counts.reshape(self.counts.shape[:2] + (3, 2, 2))[:, :, :, 1, :].sum(axis=(2, 3))
+
+    def win_rates(self):
+        """各マスの勝率（%）。対戦がないマスは NaN"""
+        games = self.games()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(games > 0, self.wins() * 100 / games, np.nan)
+
+    def cell_summary(self, deck, opponent_deck):
+        """使用デッキと相手デッキの組の集計値（summarize_counts と同じ形式）。対戦がなければ None"""
+        row = self._deck_index.get(deck)
+        column = self._opponent_index.get(opponent_deck)
+        if row is None or column is None or not self.counts[row, column].any():
+            return None
+        return summarize_counts(self.counts[row, column])
+
+    def deck_stats(self):
+        """使用デッキごとの (デッキ名, 対戦数, 勝ち数, 勝率%) を対戦数の多い順に返す（一度計算したら保持する）"""
+        if self._deck_stats is None:
+            games = self.games().sum(axis=1)
+            wins = self.wins().sum(axis=1)
+            order = np.argsort(-games, kind="stable")
+            self._deck_stats = [(self.decks[i], int(games[i]), int(wins[i]),
+                                 float(wins[i] * 100 / games[i]) if games[i] else 0.0) for i in order]
+        return self._deck_stats
+
+    def top(self, deck_limit, opponent_limit):
+        """
+        対戦数の多い使用デッキ・相手デッキだけに絞った相性表を返す（ヒートマップ表示用）。
+        行・列は対戦数の多い順に並べる。
+        """
+        games = self.games()
+        rows = np.argsort(-games.sum(axis=1), kind="stable")[:deck_limit]
+        columns = np.argsort(-games.sum(axis=0), kind="stable")[:opponent_limit]
+        return MatchupMatrix([self.decks[i] for i in rows], [self.opponent_decks[i] for i in columns],
+                             self.counts[np.ix_(rows, columns)])
+
+
+# 期間ごとの相性表（記録の追記時は追記分だけを足して更新する）
+_cache = PeriodCache(MatchupMatrix)
+
+
+def month_matchups(month):
+    """
+    指定された月の相性表を返す。
+    :param month: 文字列形式（例：'2023/10'）または (年, 月) のタプル
+    """
+    return _cache.get(("month", month_number(month if isinstance(month, tuple) else month_key(month))))
+
+
+def range_matchups(start=None, end=None):
+    """期間（date、None は制限なし）の相性表を返す"""
+    return _cache.get(("range", start, end))
\ No newline at end of file
@@ -0,0 +1,186 @@
+import tkinter as tk
+from tkinter import messagebox
+from datetime import datetime, timedelta
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.rc('font', family='Meiryo')
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from menu_functions_utils import window_key
+from matchup import month_matchups, range_matchups
+from background_tasks import LatestJobRunner
+from instrumentation import instrument_canvas, timed
+from period_selector import create_period_selector
+from confidence import format_rate
+
+# ヒートマップに表示する使用デッキ・相手デッキの数（対戦数の多い順）
+MAX_DECKS = 8
+MAX_OPPONENT_DECKS = 12
+
+
+def show_matchup_heatmap():
+    """使用デッキ×相手デッキの勝率をヒートマップで表示"""
+    if "matchup_heatmap" in window_key:
+        window_key["matchup_heatmap"].lift()
+        return
+
+    def update_month_display(change):
+        """月を変更し、データを更新"""
+        nonlocal selected_month
+        select_monthly()
+        new_date = datetime.strptime(selected_month, '%Y/%m')
+
+        if change == 0:  # 現在の月にリセット
+            new_date = datetime.today().replace(day=1)
+        elif change == 1:  # 次の月
+            new_date = (new_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+        elif change == -1:  # 前の月
+            new_date = (new_date.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+        if new_date > datetime.today().replace(day=1):
+            return
+
+        selected_month = new_date.strftime('%Y/%m')
+        month_label.config(text=f"現在の月: {selected_month}")
+        update_graph()
+
+        next_month_button.config(state="disabled" if new_date == datetime.today().replace(day=1) else "normal")
+        prev_month_button.config(state="normal")
+
+    def update_graph():
+        """指定された月（または期間）の相性表をワーカーで取得し、完了後に描画する"""
+        try:
+            period = get_period()
+        except ValueError as e:
+            messagebox.showwarning("入力エラー", str(e))
+            return
+        if period is None:
+            month = selected_month
+            heading = f"現在の月: {month}"
+            job = lambda: month_matchups(month)
+        else:
+            start, end, month = period
+            heading = f"期間: {month}"
+            job = lambda: range_matchups(start, end)
+        month_label.config(text=f"{heading} (読み込み中...)")
+        runner.submit(job, lambda matrix: draw_graph(month, heading, matrix), lambda e: show_error(heading, e),
+                      operation="matchup_heatmap.update_graph")
+
+    def show_error(heading, error):
+        """読み込み・集計に失敗した場合は表示を戻してエラーを知らせる"""
+        month_label.config(text=heading)
+        messagebox.showerror("エラー", f"データの読み込み中にエラーが発生しました: {error}")
+
+    @timed("matchup_heatmap.draw_graph", rows=None)
+    def draw_graph(month, heading, matrix):
+        """相性表を描画（表示するマスの数が同じなら既存の画像と文字を差し替える）"""
+        month_label.config(text=heading)
+        detail_label.config(text="マスをクリックすると詳細を表示します")
+        shown["matrix"] = matrix.top(MAX_DECKS, MAX_OPPONENT_DECKS) if len(matrix) else None
+        shown_matrix = shown["matrix"]
+
+        if shown_matrix is None:
+            ax.clear()
+            drawn.update(image=None, texts=[])
+            ax.text(0.5, 0.5, "データなし", fontsize=15, ha='center', va='center', transform=ax.transAxes)
+            ax.set_xticks([])
+            ax.set_yticks([])
+        else:
+            rates = shown_matrix.win_rates()
+            games = shown_matrix.games()
+            if drawn["image"] is not None and drawn["image"].get_array().shape == rates.shape:
+                drawn["image"].set_data(np.ma.masked_invalid(rates))
+            else:
+                # マスの数が変わった場合だけ軸の中身を作り直す（Figure と Axes は再利用）
+                ax.clear()
+                drawn["image"] = ax.imshow(np.ma.masked_invalid(rates), cmap="RdYlGn", vmin=0, vmax=100,
+                                           aspect="auto")
+                drawn["texts"] = [[ax.text(j, i, "", ha="center", va="center", fontsize=7)
+                                   for j in range(rates.shape[1])] for i in range(rates.shape[0])]
+                ax.set_xticks(range(rates.shape[1]))
+                ax.set_yticks(range(rates.shape[0]))
+            for i, row in enumerate(drawn["texts"]):
+                for j, text in enumerate(row):
+                    text.set_text(f"{rates[i, j]:.0f}%\n({games[i, j]})" if games[i, j] else "")
+            # 使用デッキには全相手デッキに対する通算勝率を添える
+            deck_rates = {deck: rate for deck, _, _, rate in matrix.deck_stats()}
+            ax.set_xticklabels(shown_matrix.opponent_decks, rotation=45, ha="right", fontsize=8)
+            ax.set_yticklabels([f"{deck} ({deck_rates[deck]:.0f}%)" for deck in shown_matrix.decks], fontsize=8)
+            ax.set_xlabel("相手デッキ")
+            ax.set_ylabel("使用デッキ")
+
+        ax.set_title(f"相性表 ({month})")
+        canvas.draw_idle()
+
+    def on_click(event):
+        """クリックしたマスの先後・コイン別の集計を表示"""
+        shown_matrix = shown["matrix"]
+        if shown_matrix is None or event.inaxes is not ax or event.xdata is None:
+            return
+        row, column = int(round(event.ydata)), int(round(event.xdata))
+        if not (0 <= row < len(shown_matrix.decks) and 0 <= column < len(shown_matrix.opponent_decks)):
+            return
+        deck, opponent_deck = shown_matrix.decks[row], shown_matrix.opponent_decks[column]
+        stats = shown_matrix.cell_summary(deck, opponent_deck)
+        if stats is None:
+            detail_label.config(text=f"{deck} vs {opponent_deck}: データなし")
+            return
+        detail_label.config(text=(
+            f"{deck} vs {opponent_deck}: {stats['total_matches']}戦{stats['win_count']}勝\n"
+            f"勝率: {format_rate(stats, 'win_rate')}\n"
+            f"先攻時勝率: {format_rate(stats, 'first_turn_win_rate')}\n"
+            f"後攻時勝率: {format_rate(stats, 'second_turn_win_rate')}\n"
+            f"コイン表時勝率: {format_rate(stats, 'heads_win_rate')}\n"
+            f"コイン裏時勝率: {format_rate(stats, 'tails_win_rate')}"
+        ))
+
+    # ウィンドウ作成
+    window = tk.Toplevel()
+    window.title("相性表")
+    window.geometry("700x680")
+    window_key["matchup_heatmap"] = window
+    runner = LatestJobRunner(window)
+
+    selected_month = datetime.today().strftime('%Y/%m')
+    month_label = tk.Label(window, text=f"現在の月: {selected_month}")
+    month_label.pack()
+    get_period, select_monthly = create_period_selector(window, update_graph)
+
+    figure = plt.Figure(figsize=(7, 4.5), dpi=100)
+    figure.subplots_adjust(left=0.25, bottom=0.25)
+    canvas = FigureCanvasTkAgg(figure, master=window)
+    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    canvas.mpl_connect("button_press_event", on_click)
+    instrument_canvas(canvas, "matchup_heatmap.canvas.draw")
+    ax = figure.add_subplot(111)
+    drawn = {"image": None, "texts": []}  # 現在描画されている画像とマスの文字
+    shown = {"matrix": None}  # 現在表示している（絞り込み後の）相性表
+
+    # クリックしたマスの詳細
+    detail_label = tk.Label(window, text="", justify="left")
+    detail_label.pack(pady=5)
+
+    # 月移動ボタン
+    nav_frame = tk.Frame(window)
+    nav_frame.pack(pady=10)
+
+    prev_month_button = tk.Button(nav_frame, text="前の月", command=lambda: update_month_display(-1))
+    prev_month_button.pack(side="left", padx=5)
+
+    current_month_button = tk.Button(nav_frame, text="現在の月", command=lambda: update_month_display(0))
+    current_month_button.pack(side="left", padx=5)
+
+    next_month_button = tk.Button(nav_frame, text="次の月", command=lambda: update_month_display(1))
+    next_month_button.pack(side="left", padx=5)
+
+    if selected_month == datetime.today().strftime('%Y/%m'):
+        next_month_button.config(state="disabled")
+
+    update_graph()
+
+    def on_close():
+        runner.cancel()
+        del window_key["matchup_heatmap"]
+        window.destroy()
+
+    window.protocol("WM_DELETE_WINDOW", on_close)
\ No newline at end of file
@@ -1,26 +1,16 @@
-import csv
-
-# CSVファイル名
-CSV_FILE = "master_duel_records.csv"
+from storage import get_storage
+from instrumentation import timed
 
 # グローバル変数でウィンドウ管理
 # 他のモジュールで複数のウィンドウを開いた際に、ここで管理するための辞書
 window_key = {}
 
+@timed("menu_functions_utils.read_csv_by_month")
 def read_csv_by_month(month):
     """
     指定された月のCSVデータを読み込む。
-    :param month: 文字列形式（例：'2023-10'）
+    設定された保存先（CSV/SQLite）から月単位で取得する。
+    :param month: 文字列形式（例：'2023/10'）
     :return: リスト形式のデータ
     """
-    data = []
-    try:
-        with open(CSV_FILE, "r", encoding="mbcs") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row["date"].startswith(month):  # 日付が指定された月で始まる場合
-                    data.append(row)
-    except FileNotFoundError:
-        # ファイルが存在しない場合は空リストを返す
-        pass
-    return data
\ No newline at end of file
+    return get_storage().rows_by_month(month)
\ No newline at end of file
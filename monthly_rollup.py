@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import numpy as np
+from deck_names import deck_index
+from instrumentation import timed
+from match_table import MatchTable, combination_codes, history_table, summarize_counts
+from record_store import CSV_FILE, month_key, month_number, synchronized
+from storage import CsvStorage, MergedStorage, get_analysis_storage
+
+# 集計ファイルの形式バージョン（項目を変えたら上げる）
+ROLLUP_FORMAT = 1
+
+
+def rollup_path(storage_path):
+    """保存先のファイル（CSV / SQLite）の隣に置く月別集計ファイルのパス"""
+    return storage_path + ".rollup.json"
+
+
+class MonthRollup:
+    """
+    1か月分の集計。
+    counts はコイン×勝敗×先後の組み合わせ番号ごとの件数（長さ12）で、対戦数・勝ち数・コイン表の数・先攻の数や
+    コイン×勝敗・コイン×先後のクロス集計はその部分和として求まる。
+    opponent_decks は相手デッキ名 -> 対戦数（月内で最初に現れた順）、
+    rate_min / rate_max / rate_last はレートが記録された対戦のレートの最小・最大・最後の値（なければ None）。
+    """
+
+    def __init__(self, counts=None, opponent_decks=None, rate_min=None, rate_max=None, rate_last=None):
+        self.counts = counts if counts is not None else np.zeros(12, dtype=np.int64)
+        self.opponent_decks = opponent_decks if opponent_decks is not None else {}
+        self.rate_min = rate_min
+        self.rate_max = rate_max
+        self.rate_last = rate_last
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def added(self, table, indices):
+        """表の指定した行を（行の順に）足した新しい集計を返す（自身は変更しない）"""
+        if not len(indices):
+            return self
+        rollup = MonthRollup(self.counts + np.bincount(combination_codes(table, indices), minlength=12),
+                             dict(self.opponent_decks), self.rate_min, self.rate_max, self.rate_last)
+        ids, first_index, counts = np.unique(table.opponent_deck[indices], return_index=True, return_counts=True)
+        for i in np.argsort(first_index):
+            name = table.deck_names[ids[i]]
+            rollup.opponent_decks[name] = rollup.opponent_decks.get(name, 0) + int(counts[i])
+        rates = table.rate[indices]
+        rates = rates[rates > 0]
+        if len(rates):
+            rollup._add_rates(int(rates.min()), int(rates.max()), int(rates[-1]))
+        return rollup
+
+    def merged(self, other):
+        """other の記録が自身の記録の後に続くものとして合わせた新しい集計を返す"""
+        rollup = MonthRollup(self.counts + other.counts, dict(self.opponent_decks), self.rate_min, self.rate_max,
+                             self.rate_last)
+        for name, count in other.opponent_decks.items():
+            rollup.opponent_decks[name] = rollup.opponent_decks.get(name, 0) + count
+        if other.rate_last is not None:
+            rollup._add_rates(other.rate_min, other.rate_max, other.rate_last)
+        return rollup
+
+    def _add_rates(self, rate_min, rate_max, rate_last):
+        self.rate_min = rate_min if self.rate_min is None else min(self.rate_min, rate_min)
+        self.rate_max = rate_max if self.rate_max is None else max(self.rate_max, rate_max)
+        self.rate_last = rate_last
+
+    def summary(self):
+        """集計値（summarize_counts の形式にレートの最小・最大・最後の値を加えたもの）。記録がなければ None"""
+        if not len(self):
+            return None
+        stats = summarize_counts(self.counts)
+        stats.update(rate_min=self.rate_min, rate_max=self.rate_max, rate_last=self.rate_last)
+        return stats
+
+    def opponent_deck_counts(self):
+        """相手デッキごとの対戦数を、月内で最初に現れた順の (デッキ名, 件数) のリストで返す"""
+        return list(self.opponent_decks.items())
+
+    def to_dict(self):
+        return {
+            "counts": self.counts.tolist(),
+            "opponent_decks": list(self.opponent_decks.items()),
+            "rate_min": self.rate_min,
+            "rate_max": self.rate_max,
+            "rate_last": self.rate_last,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(np.array(data["counts"], dtype=np.int64), {name: count for name, count in data["opponent_decks"]},
+                   data["rate_min"], data["rate_max"], data["rate_last"])
+
+
+def month_rollups(table):
+    """
+    表の行を月ごとに集計する（日付を解釈できない行は含めない）。
+    :return: 月の通し番号 -> MonthRollup の辞書
+    """
+    return {number: MonthRollup().added(table, table.month_indices(number))
+            for number in np.unique(table.month).tolist() if number >= 0}
+
+
+def _alias_list(names):
+    """集計ファイルに保存する、デッキ名を揃えたときの別名表の (mtime, size)"""
+    return list(names.signature) if names.signature else None
+
+
+class RollupStore:
+    """
+    1つの保存先（CSV / SQLite）の月別集計。集計ファイルに保存し、次回の起動後も記録を読まずに使う。
+    集計ファイルには作成時点の保存先の state_token と別名表の (mtime, size) を記録し、
+    どちらかが変わっていれば（このプロセスの外での編集を含む）保存先の全記録から作り直す。
+    記録の追記・編集は append_records / apply_changes を通して行い、影響する月だけを更新する。
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.path = rollup_path(storage.path)
+        self._months = None  # 月の通し番号 -> MonthRollup（未読み込みなら None）
+        self._token = None  # 集計した時点の保存先の state_token
+        self._aliases = None  # 集計した時点の別名表の (mtime, size)
+        self._lock = threading.RLock()
+
+    def _load(self):
+        """集計ファイルを読み込む。存在しない・壊れている場合は読み込まない"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") != ROLLUP_FORMAT:
+                return
+            self._months = {int(number): MonthRollup.from_dict(month) for number, month in data["months"].items()}
+            self._token = data["token"]
+            self._aliases = data["aliases"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self._months = None
+
+    def _save(self):
+        """集計ファイルを一時ファイル経由で置き換える（集計なので保存できなくても動作には影響しない）"""
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "format": ROLLUP_FORMAT,
+                    "token": self._token,
+                    "aliases": self._aliases,
+                    "months": {str(number): month.to_dict() for number, month in self._months.items()},
+                }, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def _is_current(self, token, names):
+        """集計が token の状態の保存先と、現在の別名表に対応しているか"""
+        if self._months is None:
+            self._load()
+        return self._months is not None and self._token == token and self._aliases == _alias_list(names)
+
+    def _read_table(self, names):
+        """保存先の全記録の表（既定のCSVはサイドカーを使う全履歴の表）"""
+        if isinstance(self.storage, CsvStorage) and self.storage.path == CSV_FILE:
+            return history_table(self.storage.path)
+        return MatchTable.from_rows(self.storage.get_rows(), names)
+
+    @synchronized
+    def get(self, number):
+        """月の通し番号の集計を返す（記録がなければ None）。保存先が変わっていれば作り直す"""
+        names = deck_index()
+        token = self.storage.state_token()
+        if not self._is_current(token, names):
+            # 読み込み前の状態を記録しておき、読み込み中に書き込まれても次回に作り直されるようにする
+            self._months = month_rollups(self._read_table(names))
+            self._token, self._aliases = token, _alias_list(names)
+            self._save()
+        return self._months.get(number)
+
+    @synchronized
+    def append_records(self, records):
+        """保存先に記録を追記し、追記した記録の月の集計に足す"""
+        names = deck_index()
+        current = self._is_current(self.storage.state_token(), names)
+        self.storage.append_many(records)
+        if not current:
+            return  # 集計が古ければ、次に使うときに作り直す
+        table = MatchTable.from_rows(records, names)
+        for number, rollup in month_rollups(table).items():
+            self._months[number] = self._months[number].merged(rollup) if number in self._months else rollup
+        self._token = self.storage.state_token()
+        self._save()
+
+    @synchronized
+    def apply_changes(self, updates, deletes, inserts):
+        """データ編集の変更を保存先に反映し、変更前後の行が属する月の集計だけを作り直す"""
+        names = deck_index()
+        current = self._is_current(self.storage.state_token(), names)
+        numbers = self.storage.months_of(set(updates) | set(deletes))
+        if "date" in self.storage.fieldnames:
+            date_column = self.storage.fieldnames.index("date")
+            numbers |= {month_number(month_key(str(values[date_column])))
+                        for values in list(updates.values()) + list(inserts)}
+        self.storage.apply_changes(updates, deletes, inserts)
+        if not current:
+            return
+        for number in numbers:
+            if number < 0:
+                continue
+            rows = self.storage.rows_by_month((number // 12, number % 12 + 1))
+            rollup = month_rollups(MatchTable.from_rows(rows, names)).get(number)
+            if rollup is not None:
+                self._months[number] = rollup
+            else:
+                self._months.pop(number, None)
+        self._token = self.storage.state_token()
+        self._save()
+
+
+# 保存先のファイルのパス -> RollupStore
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def rollup_store(storage):
+    """保存先（CsvStorage / SqliteStorage）の月別集計を返す"""
+    with _stores_lock:
+        store = _stores.get(storage.path)
+        if store is None or store.storage is not storage:
+            store = _stores[storage.path] = RollupStore(storage)
+        return store
+
+
+def append_records(storage, records):
+    """保存先に記録をまとめて追記し、月別集計も追記分だけ更新する"""
+    rollup_store(storage).append_records(records)
+
+
+def apply_changes(storage, updates, deletes, inserts):
+    """データ編集の変更を保存先に反映し、影響する月の集計だけを作り直す"""
+    rollup_store(storage).apply_changes(updates, deletes, inserts)
+
+
+@timed("monthly_rollup.month_rollup", rows=lambda rollup: len(rollup) if rollup else 0)
+def month_rollup(month):
+    """
+    指定された月の集計を記録を読まずに返す（記録がなければ None）。
+    集計対象が複数の記録ファイルの場合は、ファイルごとの集計を合わせる。
+    :param month: 文字列形式（例：'2023/10'）または (年, 月) のタプル
+    """
+    number = month_number(month if isinstance(month, tuple) else month_key(month))
+    storage = get_analysis_storage()
+    parts = [part for _, part in storage.parts] if isinstance(storage, MergedStorage) else [storage]
+    result = None
+    for part in parts:
+        rollup = rollup_store(part).get(number)
+        if rollup is not None:
+            result = rollup if result is None else result.merged(rollup)
+    return result
+
+
+def month_opponent_deck_counts(month):
+    """指定された月の相手デッキごとの対戦数を、月内で最初に現れた順の (デッキ名, 件数) のリストで返す"""
+    rollup = month_rollup(month)
+    return rollup.opponent_deck_counts() if rollup is not None else []
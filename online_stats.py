@@ -0,0 +1,13 @@
+from monthly_rollup import month_rollup
+from instrumentation import timed
+
+
+@timed("online_stats.month_summary", rows=lambda stats: stats["total_matches"] if stats else 0)
+def month_summary(month):
+    """
+    指定された月の集計値を返す（データがない場合は None）。
+    記録の保存・編集時に更新される月別集計から求めるため、記録は読まない。
+    :param month: 文字列形式（例：'2023/10'）または (年, 月) のタプル
+    """
+    rollup = month_rollup(month)
+    return rollup.summary() if rollup is not None else None
@@ -0,0 +1,65 @@
+import threading
+import numpy as np
+from match_table import full_table
+
+# 1つのキャッシュが保持する期間の上限（超えたら使われていないものから捨てる）
+MAX_CACHED_PERIODS = 32
+
+
+def period_indices(table, period, begin=0):
+    """
+    表の begin 行目以降のうち、期間に該当する行番号を返す。
+    :param period: ("month", 月の通し番号) または ("range", 開始日, 終了日)（None は制限なし）
+    """
+    if period[0] == "month":
+        if begin:
+            # 追記分だけを調べる
+            return np.flatnonzero(table.month[begin:] == period[1]) + begin
+        return table.month_indices(period[1])
+    _, start, end = period
+    if start is None and end is None:
+        # 全期間は日付を解釈できない行も含める（range_stats と同じ扱い）
+        return np.arange(begin, len(table))
+    day = table.day[begin:]
+    mask = day >= 0
+    if start is not None:
+        mask &= day >= start.toordinal()
+    if end is not None:
+        mask &= day <= end.toordinal()
+    return np.flatnonzero(mask) + begin
+
+
+class PeriodCache:
+    """
+    期間ごとの集計結果のキャッシュ。
+    集計結果は added(表, 行番号) で行を足した新しい結果を返すオブジェクトとし、
+    全履歴の表が追記されただけ（lineage が同じ）なら、前回以降に増えた行だけを足して更新する。
+    記録1件の追記に対する集計の更新は、集計対象の行数によらず追記分だけの計算で済む
+    （全履歴の表の連結は列のコピーになるため、そちらは行数に比例する）。
+    """
+
+    def __init__(self, empty):
+        """
+        :param empty: 空の集計結果を作る関数
+        """
+        self._empty = empty
+        self._lineage = None
+        self._entries = {}  # 期間 -> (作成時点の表の行数, 集計結果)。最近使ったものほど後ろ
+        self._lock = threading.Lock()
+
+    def get(self, period):
+        """期間の集計結果を返す"""
+        table = full_table()
+        with self._lock:
+            if self._lineage is not table.lineage:
+                self._lineage = table.lineage
+                self._entries = {}
+            length, result = self._entries.pop(period, (0, None))
+            if result is None or length > len(table):
+                length, result = 0, self._empty()
+            if length < len(table):
+                result = result.added(table, period_indices(table, period, length))
+            self._entries[period] = (len(table), result)
+            if len(self._entries) > MAX_CACHED_PERIODS:
+                del self._entries[next(iter(self._entries))]
+            return result
\ No newline at end of file
@@ -0,0 +1,34 @@
+import tkinter as tk
+from tkinter import ttk
+from periods import MONTHLY, PERIOD_OPTIONS, period_range
+
+
+def create_period_selector(parent, on_change):
+    """
+    期間の選択欄を作る。選択や「適用」で on_change() を呼ぶ。
+    :return: (現在の期間を返す関数, 月別表示に戻す関数)。期間を返す関数は月別の場合 None を返す
+    """
+    frame = tk.Frame(parent)
+    frame.pack(pady=(0, 5))
+    tk.Label(frame, text="期間:").pack(side="left")
+    option_var = tk.StringVar(value=MONTHLY)
+    combobox = ttk.Combobox(frame, textvariable=option_var, values=PERIOD_OPTIONS, state="readonly", width=10)
+    combobox.pack(side="left", padx=5)
+    combobox.bind("<<ComboboxSelected>>", lambda event: on_change())
+    start_entry = tk.Entry(frame, width=11)
+    start_entry.pack(side="left")
+    tk.Label(frame, text="～").pack(side="left")
+    end_entry = tk.Entry(frame, width=11)
+    end_entry.pack(side="left")
+    tk.Button(frame, text="適用", command=on_change).pack(side="left", padx=5)
+
+    def get_period():
+        option = option_var.get()
+        if option == MONTHLY:
+            return None
+        return period_range(option, start_entry.get(), end_entry.get())
+
+    def select_monthly():
+        option_var.set(MONTHLY)
+
+    return get_period, select_monthly
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+from record_store import month_key, parse_date
+
+MONTHLY = "月別"
+PERIOD_OPTIONS = [MONTHLY, "直近7日", "直近30日", "シーズン", "全期間", "期間指定"]
+
+
+def period_range(option, start_text="", end_text="", today=None):
+    """
+    期間の選択肢から (開始日, 終了日, 表示名) を返す。開始日・終了日が None の側は制限なし。
+    シーズンはランクマッチのシーズン（毎月1日開始）の今シーズン分とする。
+    :raises ValueError: 期間指定の日付が不正な場合
+    """
+    today = today or date.today()
+    if option == "直近7日":
+        return today - timedelta(days=6), today, "直近7日"
+    if option == "直近30日":
+        return today - timedelta(days=29), today, "直近30日"
+    if option == "シーズン":
+        return today.replace(day=1), today, f"シーズン ({today:%Y/%m})"
+    if option == "全期間":
+        return None, None, "全期間"
+    start, end = parse_date(start_text), parse_date(end_text)
+    if start is None or end is None:
+        raise ValueError("開始日と終了日を YYYY/MM/DD 形式で入力してください。")
+    if start > end:
+        raise ValueError("開始日は終了日以前の日付を入力してください。")
+    return start, end, f"{start:%Y/%m/%d}～{end:%Y/%m/%d}"
+
+
+def month_range(month_text):
+    """
+    月の文字列（例：'2024/05'）から (月初, 月末, 表示名) を返す。
+    :raises ValueError: 月を解釈できない場合
+    """
+    key = month_key(month_text)
+    if key is None:
+        raise ValueError("月を YYYY/MM 形式で入力してください。")
+    year, month = key
+    first = date(year, month, 1)
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return first, last, f"{year}/{month:02d}"
@@ -0,0 +1,67 @@
+import math
+import numpy as np
+
+# 折れ線の1点あたりに確保する横幅（ピクセル）
+PIXELS_PER_POINT = 3
+# x軸の目盛りラベル1つあたりに確保する横幅（ピクセル）
+PIXELS_PER_TICK = 30
+
+
+def lttb_indices(values, threshold):
+    """
+    Largest-Triangle-Three-Buckets で間引いた後に残す点の添字を返す。
+    x は等間隔（登録順）とみなし、各バケットから前後の点と作る三角形が最大になる点を選ぶ。
+    :param values: y の値（NaN を含まないこと）
+    :param threshold: 残す点の数
+    """
+    count = len(values)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    y = np.asarray(values, dtype=float)
+    x = np.arange(count, dtype=float)
+    bucket_size = (count - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.intp)
+    indices[0], indices[-1] = 0, count - 1
+    selected = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, count)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        areas = np.abs((x[selected] - avg_x) * (y[start:end] - y[selected])
+                       - (x[selected] - x[start:end]) * (avg_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[i + 1] = selected
+    return indices
+
+
+def decimate_indices(values, max_points):
+    """
+    描画する点の添字を返す。点数が max_points 以下ならすべて残す。
+    NaN（欠損）の点は除外して間引き、最大値・最小値の点は必ず残す。
+    """
+    y = np.asarray(values, dtype=float)
+    if len(y) <= max_points:
+        return np.arange(len(y))
+    finite = np.flatnonzero(np.isfinite(y))
+    if len(finite) == 0:
+        return finite
+    kept = finite[lttb_indices(y[finite], max_points)]
+    peaks = finite[[int(np.argmax(y[finite])), int(np.argmin(y[finite]))]]
+    return np.union1d(kept, peaks)
+
+
+def thin_tick_indices(count, max_ticks):
+    """目盛りラベルが max_ticks 個以下になるよう等間隔に間引いた添字を返す"""
+    step = max(1, math.ceil(count / max(max_ticks, 1)))
+    return list(range(0, count, step))
+
+
+def canvas_width(canvas):
+    """描画先の横幅（ピクセル）。まだ表示前ならFigureのサイズから求める"""
+    width = canvas.get_tk_widget().winfo_width()
+    if width <= 1:
+        figure = canvas.figure
+        width = figure.get_figwidth() * figure.dpi
+    return width
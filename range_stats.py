@@ -0,0 +1,163 @@
+import threading
+from datetime import date, timedelta
+import numpy as np
+from match_table import combination_codes, full_table, summarize_counts
+from instrumentation import timed
+
+# 日ごとの累積に入れる最初の日（マスターデュエルの配信開始より前の日付は入力ミスとみなす）
+FIRST_INDEXED_DATE = date(2022, 1, 1)
+
+
+def _last_indexed_day():
+    """日ごとの累積に入れる最後の日（明日）の通し番号"""
+    return (date.today() + timedelta(days=1)).toordinal()
+
+
+def _extend_cumulative(cumulative, day_count, positions, values, width):
+    """
+    累積件数 cumulative（日数+1 行 × width 列）に、positions 日目の values 列を1件ずつ足した新しい配列を返す。
+    日数・列数が増える場合は広げる。更新は最も古い追加日以降の行だけで済む。
+    """
+    extended = np.zeros((day_count + 1, width), dtype=cumulative.dtype)
+    extended[:cumulative.shape[0], :cumulative.shape[1]] = cumulative
+    extended[cumulative.shape[0]:, :cumulative.shape[1]] = cumulative[-1]  # 増えた日は最終日の累積のまま
+    if len(positions):
+        first = int(positions.min())
+        per_day = np.bincount((positions - first) * width + values, minlength=(day_count - first) * width)
+        extended[first + 1:] += np.cumsum(per_day.reshape(day_count - first, width), axis=0).astype(extended.dtype)
+    return extended
+
+
+class PrefixSums:
+    """
+    日ごとの累積件数。読み込み時に一度だけ作り、任意の期間の集計を
+    累積配列の差（O(1)）で求める。記録が追記された場合は extended で追記分の件数を足す
+    （解析・集計し直すのは追記分だけだが、累積配列は広げた配列へのコピーになるため日数×列数に比例する）。
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.last_day = _last_indexed_day()
+        dated = self._indexed(table.day)
+        days = table.day[dated]
+        self.first_day = int(days.min()) if len(days) else 0
+        self.day_count = int(days.max()) - self.first_day + 1 if len(days) else 0
+
+        # 日×組み合わせ番号の件数を累積（先頭に0の行を置き、[lo, hi) の和を cumulative[hi] - cumulative[lo] で求める）
+        codes = combination_codes(table)
+        self.cumulative = _extend_cumulative(np.zeros((1, 12), dtype=np.int64), self.day_count,
+                                             days - self.first_day, codes[dated], 12)
+        # 日付を解釈できない・範囲外の行（全期間の集計にだけ含める）
+        self.undated = np.bincount(codes[~dated], minlength=12)
+        self._deck_cumulative = None
+        self._undated_decks = None
+
+    def extended(self, table):
+        """
+        self.table の末尾に行を追記しただけの table に対応する累積件数を返す。
+        追記された行の日付より前の累積は変わらないため、集計し直すのは追記分だけで済む。
+        ただし累積配列は新しく確保してコピーするので、全体では日数×列数に比例する時間がかかる。
+        """
+        begin = len(self.table)
+        day = table.day[begin:]
+        dated = self._indexed(day)
+        if self.day_count == 0 or (dated.any() and int(day[dated].min()) < self.first_day) or \
+                self.last_day != _last_indexed_day():
+            return PrefixSums(table)  # 最初の日より前の記録が足された場合・日付が変わった場合は作り直す
+
+        sums = PrefixSums.__new__(PrefixSums)
+        sums.table = table
+        sums.last_day = self.last_day
+        sums.first_day = self.first_day
+        sums.day_count = max(self.day_count, int(day[dated].max()) - self.first_day + 1 if dated.any() else 0)
+        positions = day[dated] - self.first_day
+        codes = combination_codes(table, np.arange(begin, len(table)))
+        sums.cumulative = _extend_cumulative(self.cumulative, sums.day_count, positions, codes[dated], 12)
+        sums.undated = self.undated + np.bincount(codes[~dated], minlength=12)
+        sums._deck_cumulative = None
+        sums._undated_decks = None
+        if self._deck_cumulative is not None:
+            decks = table.opponent_deck[begin:]
+            sums._deck_cumulative = _extend_cumulative(self._deck_cumulative, sums.day_count, positions,
+                                                       decks[dated], len(table.deck_names))
+            sums._undated_decks = np.bincount(decks[~dated], minlength=len(table.deck_names))
+            sums._undated_decks[:len(self._undated_decks)] += self._undated_decks
+        return sums
+
+    def _indexed(self, day):
+        """
+        日ごとの累積に入れる行か（日付を解釈でき、FIRST_INDEXED_DATE～作成時点の明日の範囲にある）。
+        範囲外の日付（0202/12/01 のような入力ミス）は累積配列を極端に長くするため、日付のない行として扱う。
+        """
+        return (day >= FIRST_INDEXED_DATE.toordinal()) & (day <= self.last_day)
+
+    def _bounds(self, start, end):
+        """start～end（date、None は制限なし）を累積配列の [lo, hi) に変換する"""
+        lo = 0 if start is None else start.toordinal() - self.first_day
+        hi = self.day_count if end is None else end.toordinal() - self.first_day + 1
+        lo = min(max(lo, 0), self.day_count)
+        hi = min(max(hi, lo), self.day_count)
+        return lo, hi
+
+    def combination_counts(self, start=None, end=None):
+        """期間内の組み合わせ番号ごとの件数（長さ12）"""
+        lo, hi = self._bounds(start, end)
+        counts = self.cumulative[hi] - self.cumulative[lo]
+        if start is None and end is None:
+            counts = counts + self.undated
+        return counts
+
+    def summary(self, start=None, end=None):
+        """期間内の集計値（summarize_table と同じ形式）"""
+        return summarize_counts(self.combination_counts(start, end))
+
+    def opponent_deck_counts(self, start=None, end=None):
+        """期間内の相手デッキごとの対戦数を、多い順の (デッキ名, 件数) のリストで返す"""
+        deck_count = len(self.table.deck_names)
+        if self._deck_cumulative is None:
+            # 日×デッキの表は大きくなるため、初めて必要になったときに作る
+            dated = self._indexed(self.table.day)
+            decks = self.table.opponent_deck
+            self._deck_cumulative = _extend_cumulative(np.zeros((1, deck_count), dtype=np.int32), self.day_count,
+                                                       self.table.day[dated] - self.first_day, decks[dated],
+                                                       deck_count)
+            self._undated_decks = np.bincount(decks[~dated], minlength=deck_count)
+        lo, hi = self._bounds(start, end)
+        counts = self._deck_cumulative[hi] - self._deck_cumulative[lo]
+        if start is None and end is None:
+            counts = counts + self._undated_decks
+        order = np.argsort(-counts, kind="stable")
+        return [(self.table.deck_names[i], int(counts[i])) for i in order if counts[i] > 0]
+
+
+# 全履歴の表に対応する累積件数のキャッシュ
+_cache = {"table": None, "sums": None}
+_cache_lock = threading.Lock()
+
+
+@timed("range_stats.prefix_sums", rows=lambda sums: len(sums.table))
+def prefix_sums():
+    """全履歴の累積件数を返す（記録が変わっていなければ作り直さず、追記だけなら追記分を反映する）"""
+    table = full_table()
+    with _cache_lock:
+        cached = _cache["table"]
+        if cached is not table:
+            if cached is not None and cached.lineage is table.lineage and len(cached) <= len(table):
+                sums = _cache["sums"].extended(table)
+            else:
+                sums = PrefixSums(table)
+            _cache.update(table=table, sums=sums)
+        return _cache["sums"]
+
+
+@timed("range_stats.range_summary", rows=lambda stats: stats["total_matches"] if stats else 0)
+def range_summary(start=None, end=None):
+    """期間の集計値を返す（対戦がない場合は None）"""
+    stats = prefix_sums().summary(start, end)
+    return stats if stats["total_matches"] else None
+
+
+@timed("range_stats.range_opponent_deck_counts", rows=lambda counts: sum(count for _, count in counts))
+def range_opponent_deck_counts(start=None, end=None):
+    """期間の相手デッキごとの対戦数を返す"""
+    return prefix_sums().opponent_deck_counts(start, end)
\ No newline at end of file
@@ -1,14 +1,19 @@
 import tkinter as tk
+from tkinter import messagebox
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 import matplotlib
-import configparser
-import os
+import matplotlib.ticker as ticker
 matplotlib.rc('font', family='Meiryo')
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from menu_functions_utils import read_csv_by_month, window_key  # ユーティリティモジュールを使用
+from background_tasks import LatestJobRunner
+from period_selector import create_period_selector
+from storage import get_storage
+from settings_store import shared_settings
+from instrumentation import instrument_canvas, timed
+from plot_utils import canvas_width, decimate_indices, thin_tick_indices, PIXELS_PER_POINT, PIXELS_PER_TICK
 
-SETTINGS_FILE = "settings.ini"
 RANKS = [
     "R1", "B5", "B4", "B3", "B2", "B1",
     "S5", "S4", "S3", "S2", "S1",
@@ -17,31 +22,84 @@ RANKS = [
     "D5", "D4", "D3", "D2", "D1",
     "M5", "M4", "M3", "M2", "M1"
 ]
+# ランク -> 縦軸の値
+RANK_INDEX = {rank: i for i, rank in enumerate(RANKS)}
 
 
 def load_graph_type():
-    """グラフタイプを設定ファイルから読み込む"""
-    if not os.path.exists(SETTINGS_FILE):
-        config = configparser.ConfigParser()
-        config["Settings"] = {"RateGraphType": "rate"}
-        with open(SETTINGS_FILE, "w") as f:
-            config.write(f)
-        return "rate"
-    config = configparser.ConfigParser()
-    config.read(SETTINGS_FILE)
-    return config["Settings"].get("RateGraphType", "rate")
+    """グラフタイプを設定から読み込む"""
+    return shared_settings.get("RateGraphType", "rate")
 
 
 def save_graph_type(graph_type):
-    """グラフタイプを設定ファイルに保存"""
-    config = configparser.ConfigParser()
-    if os.path.exists(SETTINGS_FILE):
-        config.read(SETTINGS_FILE)
-    if "Settings" not in config:
-        config["Settings"] = {}
-    config["Settings"]["RateGraphType"] = graph_type
-    with open(SETTINGS_FILE, "w") as f:
-        config.write(f)
+    """グラフタイプを設定に保存（書き出しは設定サービスがまとめて行う）"""
+    shared_settings.set("RateGraphType", graph_type)
+
+
+def create_rate_axes(figure):
+    """
+    グラフの Axes と描画オブジェクトを作る。
+    描画オブジェクトは一度だけ作り、月や表示の切り替えでは plot_rate_graph でデータだけ差し替える。
+    """
+    ax = figure.add_subplot(111)
+    line, = ax.plot([], [], marker="o", label="レート")
+    no_data_text = ax.text(0.5, 0.5, "データなし", fontsize=15, ha='center', va='center', transform=ax.transAxes)
+    legend = ax.legend(handles=[line])
+    ax.set_xlabel("データ登録順")
+    ax.grid(True)
+    return {"ax": ax, "line": line, "no_data_text": no_data_text, "legend": legend}
+
+
+def plot_rate_graph(artists, month, data, is_rate, width):
+    """
+    読み込んだ記録で、既存の線・目盛りを差し替える（キャンバスへの描画は呼び出し側で行う）。
+    :param artists: create_rate_axes で作った描画オブジェクト
+    :param is_rate: True ならレート推移、False ならランク推移
+    :param width: 描画先の横幅（ピクセル）。点と目盛りの数をこれに合わせて間引く
+    """
+    ax, line, legend = artists["ax"], artists["line"], artists["legend"]
+    label = "レート" if is_rate else "ランク"
+    ax.set_title(f"{'レート推移' if is_rate else 'ランク推移'} ({month})")
+    artists["no_data_text"].set_visible(not data)
+    line.set_visible(bool(data))
+    legend.set_visible(bool(data))
+
+    if not data:
+        # データがない場合の表示
+        line.set_data([], [])
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.set_ylabel("")
+        return
+
+    all_dates = [row["date"] for row in data]  # 日付
+    x_indices = list(range(1, len(all_dates) + 1))  # インデックス
+
+    if is_rate:
+        # 数値でないレートは線を途切れさせる（x軸とずれないように）
+        values = [int(row["rate"]) if row["rate"].isdigit() else float("nan") for row in data]
+        ax.yaxis.set_major_locator(ticker.AutoLocator())
+        ax.yaxis.set_major_formatter(ticker.ScalarFormatter())
+        ax.tick_params(axis="y", labelsize=10)
+        ax.set_autoscaley_on(True)
+    else:
+        values = [RANK_INDEX.get(row["rank"], 0) for row in data]
+        ax.set_yticks(range(len(RANKS)))
+        ax.set_yticklabels(RANKS, fontsize=8)
+        ax.set_ylim(-0.5, len(RANKS) - 0.5)
+    ax.set_ylabel(label)
+
+    # 点と目盛りの数を描画幅に応じて抑える（山・谷は残す）
+    kept = decimate_indices(values, int(width / PIXELS_PER_POINT))
+    line.set_data([x_indices[i] for i in kept], [values[i] for i in kept])
+    line.set_marker("o" if len(kept) == len(values) else "")
+    line.set_label(label)
+    legend.get_texts()[0].set_text(label)
+    ticks = thin_tick_indices(len(x_indices), int(width / PIXELS_PER_TICK))
+    ax.set_xticks([x_indices[i] for i in ticks])
+    ax.set_xticklabels([all_dates[i] for i in ticks], rotation=45, fontsize=8)
+    ax.relim()
+    ax.autoscale_view()
 
 
 def show_rate_graph():
@@ -55,6 +113,7 @@ def show_rate_graph():
     def update_month_display(change):
         """月を変更し、データを更新"""
         nonlocal selected_month
+        select_monthly()
         new_date = datetime.strptime(selected_month, '%Y/%m')
 
         if change == 0:  # 現在の月にリセット
@@ -75,39 +134,35 @@ def show_rate_graph():
         prev_month_button.config(state="normal")
 
     def update_graph():
-        """指定された月のグラフを更新"""
-        data = read_csv_by_month(selected_month)
-        figure.clear()
-        ax = figure.add_subplot(111)
-
-        if not data:
-            # データがない場合の表示
-            ax.text(0.5, 0.5, "データなし", fontsize=15, ha='center', va='center')
-            ax.set_title(f"{'レート推移' if graph_type_var.get() == 'rate' else 'ランク推移'} ({selected_month})")
+        """指定された月（または期間）のデータをワーカーで読み込み、完了後にグラフを更新"""
+        try:
+            period = get_period()
+        except ValueError as e:
+            messagebox.showwarning("入力エラー", str(e))
+            return
+        if period is None:
+            month = selected_month
+            heading = f"現在の月: {month}"
+            job = lambda: read_csv_by_month(month)
         else:
-            all_dates = [row["date"] for row in data]  # 日付
-            x_indices = list(range(1, len(all_dates) + 1))  # インデックス
-
-            if graph_type_var.get() == "rate":
-                rates = [int(row["rate"]) for row in data if row["rate"].isdigit()]
-                ax.plot(x_indices, rates, marker="o", label="レート")
-                ax.set_ylabel("レート")
-            elif graph_type_var.get() == "rank":
-                rank_dict = {rank: i for i, rank in enumerate(RANKS)}  # ランクを数値に変換
-                ranks = [rank_dict.get(row["rank"], 0) for row in data]
-                ax.plot(x_indices, ranks, marker="o", label="ランク")
-                ax.set_yticks(range(len(RANKS)))
-                ax.set_yticklabels(RANKS, fontsize=8)
-                ax.set_ylabel("ランク")
-
-            ax.set_title(f"{'レート推移' if graph_type_var.get() == 'rate' else 'ランク推移'} ({selected_month})")
-            ax.set_xlabel("データ登録順")
-            ax.set_xticks(x_indices)
-            ax.set_xticklabels(all_dates, rotation=45, fontsize=8)
-            ax.grid(True)
-            ax.legend()
-
-        canvas.draw()
+            start, end, month = period
+            heading = f"期間: {month}"
+            job = lambda: get_storage().rows_in_range(start, end)
+        month_label.config(text=f"{heading} (読み込み中...)")
+        runner.submit(job, lambda data: draw_graph(month, heading, data), lambda e: show_error(heading, e),
+                      operation="rate_graph.update_graph")
+
+    def show_error(heading, error):
+        """読み込み・集計に失敗した場合は表示を戻してエラーを知らせる"""
+        month_label.config(text=heading)
+        messagebox.showerror("エラー", f"データの読み込み中にエラーが発生しました: {error}")
+
+    @timed("rate_graph.draw_graph", rows=None)
+    def draw_graph(month, heading, data):
+        """読み込んだデータで、既存の線・目盛りを差し替えてグラフを更新"""
+        month_label.config(text=heading)
+        plot_rate_graph(artists, month, data, graph_type_var.get() == "rate", canvas_width(canvas))
+        canvas.draw_idle()
 
     def toggle_graph_type():
         """グラフタイプを切り替え"""
@@ -120,18 +175,23 @@ def show_rate_graph():
     # ウィンドウ作成
     window = tk.Toplevel()
     window.title("レート推移 / ランク推移")
-    window.geometry("600x400")
+    window.geometry("600x430")
     window_key["rate_graph"] = window
+    runner = LatestJobRunner(window)
 
     selected_month = datetime.today().strftime('%Y/%m')
     graph_type_var = tk.StringVar(value=graph_type)  # グラフタイプを保持
 
     month_label = tk.Label(window, text=f"現在の月: {selected_month}")
     month_label.pack()
+    get_period, select_monthly = create_period_selector(window, update_graph)
 
     figure = plt.Figure(figsize=(6, 3), dpi=100)
     canvas = FigureCanvasTkAgg(figure, master=window)
     canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    instrument_canvas(canvas, "rate_graph.canvas.draw")
+
+    artists = create_rate_axes(figure)
 
     # トグルボタンを追加
     toggle_button = tk.Button(window, text="表示切り替え (レート⇔ランク)", command=toggle_graph_type)
@@ -157,6 +217,7 @@ def show_rate_graph():
     update_graph()
 
     def on_close():
+        runner.cancel()
         del window_key["rate_graph"]
         window.destroy()
 
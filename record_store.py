@@ -0,0 +1,386 @@
+import codecs
+import csv
+import functools
+import io
+import os
+import re
+import threading
+from datetime import date
+from instrumentation import timed
+
+# CSVファイル名
+CSV_FILE = "master_duel_records.csv"
+
+
+def _csv_encoding():
+    """記録ファイルの文字コード（Windows の mbcs。mbcs のない環境では同じ Shift_JIS 系の cp932）"""
+    try:
+        codecs.lookup("mbcs")
+    except LookupError:
+        return "cp932"
+    return "mbcs"
+
+
+CSV_ENCODING = _csv_encoding()
+# 追記判定に使う、読み込み済み末尾のバイト数
+TAIL_MARKER_SIZE = 64
+
+# 全角数字・記号を半角に変換するテーブル
+_HALF_WIDTH_TABLE = str.maketrans("０１２３４５６７８９／－．", "0123456789/-.")
+# 年と月の抽出（2024/05/01, 2024-5-1, 2024.5.1, 2024年5月1日 などに対応）
+_YEAR_MONTH_PATTERN = re.compile(r"^\s*(\d{4})\s*[/\-.年]\s*(\d{1,2})")
+_DATE_PATTERN = re.compile(r"^\s*(\d{4})\s*[/\-.年]\s*(\d{1,2})\s*[/\-.月]\s*(\d{1,2})")
+
+
+def month_key(date_text):
+    """
+    日付文字列から (年, 月) のキーを取り出す。
+    :param date_text: 文字列形式（例：'2024/05/01', '2024-5-1', '2024/05'）
+    :return: (int, int) のタプル。解釈できない場合は None
+    """
+    match = _YEAR_MONTH_PATTERN.match(date_text.translate(_HALF_WIDTH_TABLE))
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    if not 1 <= month <= 12:
+        return None
+    return year, month
+
+
+def parse_date(date_text):
+    """
+    日付文字列を date に変換する（month_key と同じ表記ゆれに対応）。
+    :return: date。解釈できない場合は None
+    """
+    match = _DATE_PATTERN.match(date_text.translate(_HALF_WIDTH_TABLE))
+    if not match:
+        return None
+    try:
+        return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    except ValueError:
+        return None
+
+
+def month_number(key):
+    """(年, 月) のキーを通し番号（年*12 + 月-1）に変換する。None は -1"""
+    if key is None:
+        return -1
+    year, month = key
+    return year * 12 + month - 1
+
+
+def synchronized(method):
+    """インスタンスの self._lock を取得してからメソッドを実行する（分析用スレッドとの排他用）"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def file_signature(path):
+    """ファイルの (mtime, size) を返す。存在しない場合は None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+@timed("record_store.read_csv_rows", rows=lambda result: len(result[1]))
+def read_csv_rows(f, offset=0, fieldnames=None):
+    """
+    バイナリモードで開いたCSVを offset 以降だけ解析する。
+    :param fieldnames: 途中から読む場合のヘッダー（None の場合は先頭行をヘッダーとして読む）
+    :return: (ヘッダー, 行のリスト, 読み終えたバイト位置, 読んだ部分の末尾バイト列)
+    """
+    f.seek(offset)
+    data = f.read()
+    # 書きかけの最終行は解析せず、次回その行の先頭から読み直す
+    data = data[:complete_length(data)]
+    reader = csv.DictReader(io.StringIO(data.decode(CSV_ENCODING), newline=""), fieldnames=fieldnames)
+    rows = list(reader)
+    return list(reader.fieldnames or []), rows, offset + len(data), data[-TAIL_MARKER_SIZE:]
+
+
+def complete_length(data):
+    """
+    data のうち、最後の行の区切り（クォートの外側の改行）までのバイト数。
+    改行の前にある '"' の数が偶数なら、その改行はクォートの外側にある。
+    """
+    quotes = data.count(b'"')
+    position = data.rfind(b"\n")
+    while position >= 0:
+        if (quotes - data.count(b'"', position)) % 2 == 0:
+            return position + 1
+        position = data.rfind(b"\n", 0, position)
+    return 0
+
+
+def is_appended(f, size, offset, tail_marker):
+    """
+    offset まで解析済みのファイルが、その後末尾への追記だけで変化したかを判定する。
+    :param tail_marker: 解析済み部分の末尾バイト列
+    """
+    if offset == 0 or size <= offset:
+        return False
+    f.seek(offset - len(tail_marker))
+    return f.read(len(tail_marker)) == tail_marker
+
+
+def read_last_record(path=CSV_FILE, chunk_size=4096):
+    """
+    ファイル末尾から逆方向に読み、最後の1件だけを解析して返す。
+    改行の後ろにある '"' の数が偶数なら、その改行はクォートの外側（行の区切り）と判断できるため、
+    備考欄に改行を含む行でも正しく区切りを見つけられる。
+    :return: 辞書形式の最後の記録。データ行がない場合は None
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        header_line = f.readline()
+        fieldnames = next(csv.reader([header_line.decode(CSV_ENCODING)]), [])
+        position = f.seek(0, os.SEEK_END)
+        tail = b""
+        quotes = 0
+        while position > 0:
+            read_size = min(chunk_size, position)
+            position -= read_size
+            f.seek(position)
+            tail = f.read(read_size) + tail
+            # 新しく読んだ部分だけを後ろから走査する
+            for i in range(read_size - 1, -1, -1):
+                byte = tail[i]
+                if byte == 0x22:  # '"'
+                    quotes += 1
+                elif byte == 0x0A and quotes % 2 == 0 and tail[i + 1:].strip(b"\r\n"):
+                    text = tail[i + 1:].decode(CSV_ENCODING)
+                    values = next(csv.reader(io.StringIO(text, newline="")))
+                    return dict(zip(fieldnames, values))
+    # 区切りが見つからない場合はヘッダー行しかない
+    return None
+
+
+class RecordStore:
+    """
+    戦績CSVを一度だけ読み込み、解析済みの行をメモリ上に保持する。
+    ファイルの更新時刻/サイズが変わった場合のみ読み直す。
+    """
+
+    def __init__(self, path=CSV_FILE):
+        self.path = path
+        self.fieldnames = []
+        self.rows = []
+        self._month_index = {}  # (年, 月) -> その月の行のリスト
+        self._signature = None  # 読み込み時点の (mtime, size)
+        self._offset = 0  # 解析済みのバイト位置
+        self._tail_marker = b""  # 解析済み部分の末尾バイト列（追記のみかの確認用）
+        self.version = 0  # キャッシュ内容が変わるたびに増える
+        self.rewrite_version = 0  # 末尾への追記以外でキャッシュ内容が変わるたびに増える
+        self._lock = threading.RLock()
+
+    def _load(self, f):
+        """CSV全体を読み込んでキャッシュを作り直す"""
+        self.fieldnames, self.rows, self._offset, self._tail_marker = read_csv_rows(f)
+        self._rebuild_index()
+        self.version += 1
+        self.rewrite_version += 1
+
+    def _load_tail(self, f):
+        """前回の解析位置以降に追記された行だけを読み込んで反映する"""
+        _, rows, self._offset, tail = read_csv_rows(f, self._offset, self.fieldnames)
+        for row in rows:
+            self.rows.append(row)
+            self._index_row(row)
+        self._tail_marker = (self._tail_marker + tail)[-TAIL_MARKER_SIZE:]
+        self.version += 1
+
+    def _clear(self):
+        self.fieldnames = []
+        self.rows = []
+        self._month_index = {}
+        self._offset = 0
+        self._tail_marker = b""
+        self.version += 1
+        self.rewrite_version += 1
+
+    def _rebuild_index(self):
+        """月別インデックスを作り直す"""
+        self._month_index = {}
+        for row in self.rows:
+            self._index_row(row)
+
+    def _index_row(self, row):
+        """1行を月別インデックスに登録する"""
+        key = month_key(row.get("date") or "")
+        if key is not None:
+            self._month_index.setdefault(key, []).append(row)
+
+    @synchronized
+    def refresh(self):
+        """ファイルが変更されていればキャッシュを更新する"""
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return
+        if signature is None:
+            self._clear()
+        else:
+            with open(self.path, "rb") as f:
+                if self.fieldnames and is_appended(f, signature[1], self._offset, self._tail_marker):
+                    self._load_tail(f)
+                else:
+                    self._load(f)
+        self._signature = signature
+
+    @synchronized
+    def invalidate(self):
+        """次回アクセス時に必ず読み直す"""
+        self._signature = None
+
+    @synchronized
+    def get_rows(self):
+        """全記録を返す"""
+        self.refresh()
+        return self.rows
+
+    @synchronized
+    def rows_by_month(self, month):
+        """
+        指定された月の記録を返す。
+        :param month: 文字列形式（例：'2023/10'）または (年, 月) のタプル
+        """
+        self.refresh()
+        key = month if isinstance(month, tuple) else month_key(month)
+        return list(self._month_index.get(key, []))
+
+    @synchronized
+    def rows_in_range(self, start=None, end=None):
+        """
+        start～end（両端を含む）の記録を月順に返す。start/end が None の場合はその側を制限しない。
+        両方 None の場合は日付を解釈できない行も含めた全記録を返す。
+        """
+        self.refresh()
+        if start is None and end is None:
+            return list(self.rows)
+        first = month_number((start.year, start.month)) if start else None
+        last = month_number((end.year, end.month)) if end else None
+        rows = []
+        for key in sorted(self._month_index):
+            number = month_number(key)
+            if (first is not None and number < first) or (last is not None and number > last):
+                continue
+            for row in self._month_index[key]:
+                day = parse_date(row["date"])
+                if day is not None and (start is None or day >= start) and (end is None or day <= end):
+                    rows.append(row)
+        return rows
+
+    @synchronized
+    def append(self, record):
+        """1件の記録をCSVに追記し、追記分だけをキャッシュに反映する"""
+        file_exists = os.path.exists(self.path)
+        with open(self.path, "a", encoding=CSV_ENCODING, newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=record.keys())
+            if not file_exists:
+                writer.writeheader()
+            writer.writerow(record)
+        self.refresh()
+
+    @synchronized
+    def append_many(self, records):
+        """
+        複数の記録を1回の書き込みでCSVに追記し、fsync してから追記分をキャッシュに反映する。
+        まだ読み込んでいなければ読み込まない（次に記録を使うときに読む）。
+        """
+        if not records:
+            return
+        loaded = self._signature is not None
+        file_exists = os.path.exists(self.path)
+        with open(self.path, "a", encoding=CSV_ENCODING, newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=records[0].keys())
+            if not file_exists:
+                writer.writeheader()
+            writer.writerows(records)
+            f.flush()
+            os.fsync(f.fileno())
+        if loaded:
+            self.refresh()
+
+    @synchronized
+    def truncate(self, size):
+        """
+        ファイルを size バイトに切り詰め、キャッシュも読み直す（中断した追記の取り消し用）。
+        size が 0 の場合はファイルを削除する（見出し行も書き直されるようにする）。
+        まだ読み込んでいなければ読み込まない。
+        """
+        loaded = self._signature is not None
+        if size == 0:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        elif os.path.getsize(self.path) > size:
+            with open(self.path, "r+b") as f:
+                f.truncate(size)
+                f.flush()
+                os.fsync(f.fileno())
+        self.invalidate()
+        if loaded:
+            self.refresh()
+
+    @synchronized
+    def replace_all(self, fieldnames, rows):
+        """
+        CSV全体を書き換え、キャッシュも読み直す。
+        :param rows: 値のリストのリスト（fieldnamesと同じ並び）
+        """
+        with open(self.path, "w", encoding=CSV_ENCODING, newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            writer.writerows(rows)
+        self.invalidate()
+        self.refresh()
+
+    @synchronized
+    def apply_changes(self, updates, deletes, inserts):
+        """
+        変更のあった行だけを反映してCSVを保存する。
+        未変更の行はキャッシュ済みの内容をそのまま書き出し、一時ファイルに書き終えてから
+        置き換えるため、途中で失敗しても元のファイルは壊れない。
+        :param updates: 行番号 -> 新しい値のリスト
+        :param deletes: 削除する行番号の集合
+        :param inserts: 末尾に追加する値のリストのリスト
+        """
+        self.refresh()
+        rows = []
+        for index, row in enumerate(self.rows):
+            if index in deletes:
+                continue
+            if index in updates:
+                row = dict(zip(self.fieldnames, (str(value) for value in updates[index])))
+            rows.append(row)
+        rows.extend(dict(zip(self.fieldnames, (str(value) for value in values))) for values in inserts)
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding=CSV_ENCODING, newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+        # 書き出した内容でキャッシュを更新する（読み直しはしない）
+        self.rows = rows
+        self._rebuild_index()
+        with open(self.path, "rb") as f:
+            self._offset = f.seek(0, os.SEEK_END)
+            f.seek(max(0, self._offset - TAIL_MARKER_SIZE))
+            self._tail_marker = f.read()
+        self._signature = file_signature(self.path)
+        self.version += 1
+        self.rewrite_version += 1
+
+
+# プロセス全体で共有するストア
+shared_store = RecordStore()
@@ -0,0 +1,239 @@
+"""
+戦績の集計レポートをコマンドラインから作成する（画面を開かずに実行できる）。
+
+    python report.py --period 直近30日
+    python report.py --month 2024/05 --format json --output report.json --png report.png
+    python report.py --period シーズン --all-sources
+
+Tk は読み込まず、matplotlib も --png を指定したときだけ Agg バックエンドで読み込む。
+"""
+import argparse
+import os
+import sys
+
+REPORT_FORMATS = ("text", "json", "csv")
+REPORT_PERIODS = ("直近7日", "直近30日", "シーズン", "全期間")
+# PNG のグラフで折れ線に使う横幅（ピクセル）
+PNG_LINE_WIDTH = 600
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析する。:return: (パーサー, 引数)"""
+    parser = argparse.ArgumentParser(description="戦績の集計レポートを作成する")
+    period = parser.add_mutually_exclusive_group()
+    period.add_argument("--month", help="対象の月（例：2024/05）。期間の指定がなければ今月")
+    period.add_argument("--period", choices=REPORT_PERIODS, help="対象の期間")
+    period.add_argument("--from", dest="start", help="期間の開始日（例：2024/05/01）。--to と組み合わせる")
+    parser.add_argument("--to", dest="end", help="期間の終了日（例：2024/05/31）")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="text", help="出力形式（既定: text）")
+    parser.add_argument("--output", help="出力先のファイル（省略時は標準出力）")
+    parser.add_argument("--png", help="環境分布とレート推移のグラフを保存するPNGファイル")
+    parser.add_argument("--dir", help="記録ファイルと settings.ini のあるフォルダ（省略時はカレントフォルダ）")
+    parser.add_argument("--all-sources", action="store_true",
+                        help="設定によらず record_sources.csv の記録ファイルもまとめて集計する")
+    args = parser.parse_args(argv)
+    if (args.start is None) != (args.end is None):
+        parser.error("--from と --to は両方指定してください。")
+    return parser, args
+
+
+def resolve_period(args):
+    """
+    引数から (開始日, 終了日, 表示名) を求める。
+    :raises ValueError: 日付や月を解釈できない場合
+    """
+    from datetime import date
+    from periods import month_range, period_range
+    if args.period:
+        return period_range(args.period)
+    if args.start is not None:
+        return period_range("期間指定", args.start, args.end)
+    return month_range(args.month or date.today().strftime("%Y/%m"))
+
+
+def rate_statistics(rows):
+    """
+    期間内の記録からレート・ランクの推移をまとめる。
+    レートが未入力（0）や数値でない記録は除く。
+    """
+    from match_table import RANK_INDEX
+    rates = [int(row["rate"]) for row in rows if str(row.get("rate") or "").isdigit() and int(row["rate"]) > 0]
+    ranks = [row["rank"] for row in rows if row.get("rank") in RANK_INDEX]
+    stats = {"rated_matches": len(rates)}
+    if rates:
+        stats.update(first_rate=rates[0], last_rate=rates[-1], rate_change=rates[-1] - rates[0],
+                     highest_rate=max(rates), lowest_rate=min(rates))
+    if ranks:
+        stats.update(first_rank=ranks[0], last_rank=ranks[-1], highest_rank=max(ranks, key=RANK_INDEX.get))
+    return stats
+
+
+def build_report(start, end, label):
+    """
+    期間の集計結果を辞書で返す（戦績まとめ・環境分布・レート推移の集計）。
+    レート推移は設定中の保存先の記録だけから求める（アカウントごとにレートが異なるため）。
+    :return: (レポート, 期間内の記録)
+    """
+    from collections import Counter
+    from range_stats import range_opponent_deck_counts, range_summary
+    from storage import MAIN_SOURCE, SOURCE_COLUMN, get_analysis_storage, get_storage
+    summary = range_summary(start, end)
+    deck_counts = range_opponent_deck_counts(start, end)
+    total = sum(count for _, count in deck_counts)
+    rows = get_storage().rows_in_range(start, end)
+    analysis = get_analysis_storage()
+    source_rows = rows if analysis is get_storage() else analysis.rows_in_range(start, end)
+    source_counts = Counter(row.get(SOURCE_COLUMN, MAIN_SOURCE) for row in source_rows)
+    report = {
+        "period": {
+            "label": label,
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+        },
+        "sources": [{"source": source, "count": count} for source, count in source_counts.items()],
+        "summary": summary,
+        "environment": [{"opponent_deck": deck, "count": count, "share": count * 100 / total}
+                        for deck, count in deck_counts],
+        "rate": rate_statistics(rows),
+    }
+    return report, rows
+
+
+def format_text(report):
+    """レポートを読みやすい文字列にする"""
+    from confidence import CONFIDENCE_LEVEL, format_rate
+    lines = [f"期間: {report['period']['label']}"]
+    if len(report["sources"]) > 1:
+        lines.append("記録: " + " / ".join(f"{item['source']} {item['count']}件" for item in report["sources"]))
+    lines.append("")
+    stats = report["summary"]
+    lines.append("[戦績まとめ]")
+    if stats is None:
+        lines.append("データなし")
+    else:
+        lines += [
+            f"対戦数: {stats['total_matches']}",
+            f"勝率: {format_rate(stats, 'win_rate')}",
+            f"コイン表率: {format_rate(stats, 'heads_rate')}",
+            f"先攻率: {format_rate(stats, 'first_turn_rate')}",
+            f"先攻時勝率: {format_rate(stats, 'first_turn_win_rate')}",
+            f"後攻時勝率: {format_rate(stats, 'second_turn_win_rate')}",
+            f"コイン表時勝率: {format_rate(stats, 'heads_win_rate')}",
+            f"コイン裏時勝率: {format_rate(stats, 'tails_win_rate')}",
+            f"コイン表時先攻率: {format_rate(stats, 'heads_first_turn_rate')}",
+            f"コイン裏時先攻率: {format_rate(stats, 'tails_first_turn_rate')}",
+            f"（括弧内は{CONFIDENCE_LEVEL}%信頼区間と母数）",
+        ]
+    lines += ["", "[環境分布]"]
+    if not report["environment"]:
+        lines.append("データなし")
+    for item in report["environment"]:
+        lines.append(f"{item['opponent_deck']}: {item['count']} ({item['share']:.1f}%)")
+    rate = report["rate"]
+    lines += ["", "[レート・ランク推移]", f"レート記録数: {rate['rated_matches']}"]
+    if "first_rate" in rate:
+        lines.append(f"レート: {rate['first_rate']} → {rate['last_rate']} ({rate['rate_change']:+d}) "
+                     f"最高 {rate['highest_rate']} / 最低 {rate['lowest_rate']}")
+    if "first_rank" in rate:
+        lines.append(f"ランク: {rate['first_rank']} → {rate['last_rank']} (最高 {rate['highest_rank']})")
+    return "\n".join(lines) + "\n"
+
+
+def format_json(report):
+    """レポートをJSON文字列にする"""
+    import json
+    return json.dumps(report, ensure_ascii=False, indent=2) + "\n"
+
+
+def write_csv(report, f):
+    """レポートを (区分, 項目, 値) の3列のCSVとして書き出す"""
+    import csv
+    writer = csv.writer(f)
+    writer.writerow(["section", "key", "value"])
+    for key, value in report["period"].items():
+        writer.writerow(["period", key, "" if value is None else value])
+    for item in report["sources"]:
+        writer.writerow(["source", item["source"], item["count"]])
+    for key, value in (report["summary"] or {}).items():
+        if key == "intervals":
+            for rate_key, interval in value.items():
+                low, high = interval if interval else ("", "")
+                writer.writerow(["interval", f"{rate_key}_low", low])
+                writer.writerow(["interval", f"{rate_key}_high", high])
+        else:
+            writer.writerow(["summary", key, value])
+    for item in report["environment"]:
+        writer.writerow(["environment", item["opponent_deck"], item["count"]])
+    for key, value in report["rate"].items():
+        writer.writerow(["rate", key, value])
+
+
+def save_png(report, rows, path):
+    """環境分布（棒グラフ）とレート推移（折れ線）を1枚のPNGに保存する"""
+    import matplotlib
+    matplotlib.use("Agg")
+    matplotlib.rc('font', family='Meiryo')
+    from matplotlib.figure import Figure
+    from plot_utils import decimate_indices, PIXELS_PER_POINT
+
+    figure = Figure(figsize=(10, 4), dpi=100)
+    deck_ax, rate_ax = figure.subplots(1, 2)
+    environment = report["environment"]
+    if environment:
+        deck_ax.bar(range(len(environment)), [item["count"] for item in environment])
+        deck_ax.set_xticks(range(len(environment)))
+        deck_ax.set_xticklabels([item["opponent_deck"] for item in environment], rotation=45, fontsize=8)
+    else:
+        deck_ax.text(0.5, 0.5, "データなし", fontsize=15, ha='center', va='center', transform=deck_ax.transAxes)
+    deck_ax.set_title(f"環境分布 ({report['period']['label']})")
+
+    values = [int(row["rate"]) if str(row.get("rate") or "").isdigit() else float("nan") for row in rows]
+    if values:
+        kept = decimate_indices(values, int(PNG_LINE_WIDTH / PIXELS_PER_POINT))
+        rate_ax.plot([i + 1 for i in kept], [values[i] for i in kept])
+        rate_ax.set_xlabel("データ登録順")
+        rate_ax.grid(True)
+    else:
+        rate_ax.text(0.5, 0.5, "データなし", fontsize=15, ha='center', va='center', transform=rate_ax.transAxes)
+    rate_ax.set_title(f"レート推移 ({report['period']['label']})")
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+def main(argv=None):
+    parser, args = parse_args(argv)
+    if args.dir:
+        # 出力先は起動時のカレントフォルダからの相対パスとして解決しておく
+        args.output = os.path.abspath(args.output) if args.output else args.output
+        args.png = os.path.abspath(args.png) if args.png else args.png
+        os.chdir(args.dir)  # 記録ファイル・設定ファイルはカレントフォルダから読む
+    if args.all_sources:
+        from storage import use_merged_storage
+        use_merged_storage(True)
+    try:
+        start, end, label = resolve_period(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report, rows = build_report(start, end, label)
+    if args.format == "csv":
+        from record_store import CSV_ENCODING
+        if args.output:
+            with open(args.output, "w", encoding=CSV_ENCODING, newline="") as f:
+                write_csv(report, f)
+        else:
+            write_csv(report, sys.stdout)
+    else:
+        text = format_json(report) if args.format == "json" else format_text(report)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text)
+    if args.png:
+        save_png(report, rows, args.png)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,91 @@
+import atexit
+import configparser
+import os
+import threading
+from record_store import file_signature, synchronized
+
+SETTINGS_FILE = "settings.ini"
+SETTINGS_SECTION = "Settings"
+# 変更してから書き出すまでの待ち時間（秒）。その間の変更は1回の書き込みにまとめる
+FLUSH_DELAY = 1.0
+
+
+class SettingsStore:
+    """
+    settings.ini を初回の読み込み時に一度だけ解析し、以降の読み込みはメモリ上の内容から返す。
+    変更はキーごとに反映し、最後の変更から FLUSH_DELAY 秒後に一時ファイル経由でまとめて置き換える。
+    書き出す前にファイルが外部で変更されていれば読み直し、未保存のキーだけを上書きする
+    （他のモジュールや手で編集したキーを消さない）。
+    """
+
+    def __init__(self, path=SETTINGS_FILE, delay=FLUSH_DELAY):
+        self.path = path
+        self.delay = delay
+        self._config = None
+        self._signature = None  # 読み込み・書き出し時点の (mtime, size)
+        self._pending = {}  # 未保存のキー -> 値
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def _read(self):
+        config = configparser.ConfigParser()
+        config.read(self.path)
+        if SETTINGS_SECTION not in config:
+            config[SETTINGS_SECTION] = {}
+        self._config = config
+        self._signature = file_signature(self.path)
+
+    @synchronized
+    def get(self, key, default=None):
+        """設定値を文字列で返す（キーがなければ default）"""
+        if self._config is None:
+            self._read()
+        return self._config[SETTINGS_SECTION].get(key, default)
+
+    @synchronized
+    def update(self, values):
+        """
+        指定したキーだけを変更し、書き出しを予約する。
+        :param values: キー -> 値 の辞書（値は文字列に変換して保存する）
+        """
+        if self._config is None:
+            self._read()
+        for key, value in values.items():
+            self._config[SETTINGS_SECTION][key] = str(value)
+            self._pending[key] = str(value)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def set(self, key, value):
+        """1つのキーを変更する"""
+        self.update({key: value})
+
+    @synchronized
+    def flush(self):
+        """未保存の変更があればファイルに書き出す（途中で失敗しても元のファイルは壊れない）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        if file_signature(self.path) != self._signature:
+            # 外部で変更された内容に、未保存の変更を重ねる
+            self._read()
+            for key, value in self._pending.items():
+                self._config[SETTINGS_SECTION][key] = value
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            self._config.write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._signature = file_signature(self.path)
+        self._pending = {}
+
+
+# プロセス全体で共有する設定（終了時に未保存の変更を書き出す）
+shared_settings = SettingsStore()
+atexit.register(shared_settings.flush)
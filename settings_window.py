@@ -1,55 +1,46 @@
 import tkinter as tk
 from tkinter import messagebox, filedialog
 import os
-import configparser
 import subprocess
+from storage import SOURCES_FILE, create_record_sources_file, export_csv, get_storage, import_csv, reset_storage
+from settings_store import shared_settings
+from append_journal import shared_journal, write_lock
 
-SETTINGS_FILE = "settings.ini"
 
-
-# 設定を読み込み
-def load_settings():
-    if not os.path.exists(SETTINGS_FILE):
-        config = configparser.ConfigParser()
-        config["Settings"] = {
-            "SaveLocation": os.getcwd(),
-            "StartupWindow": "None"
-        }
-        with open(SETTINGS_FILE, "w") as f:
-            config.write(f)
-    config = configparser.ConfigParser()
-    config.read(SETTINGS_FILE)
-    return config
-
-
-# 設定を保存
-def save_settings(save_location, startup_window):
-    config = configparser.ConfigParser()
-    config["Settings"] = {
+# 設定を保存（書き出しは設定サービスがまとめて行う）
+def save_settings(save_location, startup_window, storage_backend="csv", merge_sources=False):
+    shared_settings.update({
         "SaveLocation": save_location,
-        "StartupWindow": startup_window
-    }
-    with open(SETTINGS_FILE, "w") as f:
-        config.write(f)
+        "StartupWindow": startup_window,
+        "StorageBackend": storage_backend,
+        "MergeSources": "yes" if merge_sources else "no"
+    })
+    if merge_sources:
+        create_record_sources_file()  # 一覧を編集できるように用意しておく
+    shared_journal.commit()  # 未反映の記録は変更前の保存先に書き込む
+    reset_storage()  # 保存形式・集計対象の変更を反映させる
 
 
 def open_settings_window():
     """設定ウィンドウを表示"""
-    settings = load_settings()
-
     # キーが存在しない場合のデフォルト設定
-    save_location = settings["Settings"].get("SaveLocation", os.getcwd())
-    startup_windows = settings["Settings"].get("StartupWindow", "").split(",")  # 複数選択対応
+    save_location = shared_settings.get("SaveLocation", os.getcwd())
+    startup_windows = shared_settings.get("StartupWindow", "").split(",")  # 複数選択対応
+    storage_backend = shared_settings.get("StorageBackend", "csv")
+    merge_sources = shared_settings.get("MergeSources", "no") == "yes"
 
     def reset_data():
-        """データリセット"""
-        if not os.path.exists(save_location):
-            messagebox.showinfo("情報", "データファイルが見つかりません。")
+        """データリセット（使用中の保存先の全記録を削除する）"""
+        if not get_storage().row_count() and not shared_journal.pending():
+            messagebox.showinfo("情報", "削除するデータがありません。")
             return
         confirm = messagebox.askyesno("確認", "データを完全に削除します。よろしいですか？")
         if confirm:
             try:
-                os.remove(os.path.join(save_location, "master_duel_records.csv"))
+                shared_journal.commit()  # 未反映の記録も削除の対象にする
+                with write_lock():
+                    get_storage().clear()
+                reset_storage()  # 集計用の保存先も選び直す
                 messagebox.showinfo("成功", "データをリセットしました。")
             except Exception as e:
                 messagebox.showerror("エラー", f"データ削除中にエラーが発生しました: {e}")
@@ -70,6 +61,38 @@ def open_settings_window():
             save_location = os.path.normpath(selected_folder)
             save_location_label.config(text=save_location)
 
+    def open_record_sources():
+        """追加の記録ファイルの一覧を開く（なければ作る）"""
+        try:
+            create_record_sources_file()
+            subprocess.Popen(f'explorer "{os.path.abspath(SOURCES_FILE)}"')
+        except Exception as e:
+            messagebox.showerror("エラー", f"{SOURCES_FILE} を開けませんでした: {e}")
+
+    def import_to_sqlite():
+        """CSVの記録をSQLiteへ取り込む"""
+        confirm = messagebox.askyesno("確認", "SQLiteの内容をCSVの記録で置き換えます。よろしいですか？")
+        if confirm:
+            try:
+                shared_journal.commit()  # 未反映の記録も取り込む
+                with write_lock():
+                    count = import_csv()
+                messagebox.showinfo("成功", f"{count}件の記録を取り込みました。")
+            except Exception as e:
+                messagebox.showerror("エラー", f"取り込み中にエラーが発生しました: {e}")
+
+    def export_from_sqlite():
+        """SQLiteの記録をCSVへ書き出す"""
+        confirm = messagebox.askyesno("確認", "CSVの内容をSQLiteの記録で置き換えます。よろしいですか？")
+        if confirm:
+            try:
+                shared_journal.commit()  # 未反映の記録も書き出す
+                with write_lock():
+                    count = export_csv()
+                messagebox.showinfo("成功", f"{count}件の記録を書き出しました。")
+            except Exception as e:
+                messagebox.showerror("エラー", f"書き出し中にエラーが発生しました: {e}")
+
     def save_changes():
         """変更を保存し、設定ウィンドウを閉じる"""
         # 保存場所のパスを正規化
@@ -79,14 +102,15 @@ def open_settings_window():
             window_var.get() for window_var in startup_window_vars if window_var.get()
         ]
         # 設定を保存
-        save_settings(normalized_save_location, ",".join(selected_windows))
+        save_settings(normalized_save_location, ",".join(selected_windows), storage_backend_var.get(),
+                      merge_sources_var.get())
         # 設定ウィンドウを閉じる
         window.destroy()
 
     # 設定ウィンドウ作成
     window = tk.Toplevel()
     window.title("設定")
-    window.geometry("400x350")
+    window.geometry("400x570")
 
     # データリセット
     tk.Label(window, text="データリセット:").pack(anchor="w", pady=(10, 0), padx=10)
@@ -117,6 +141,23 @@ def open_settings_window():
     tk.Checkbutton(window, text="戦績まとめ", variable=startup_window_vars[2], onvalue="MatchSummary",
                    offvalue="").pack(anchor="w", padx=20)
 
+    # 保存形式
+    tk.Label(window, text="保存形式:").pack(anchor="w", pady=(10, 0), padx=10)
+    storage_backend_var = tk.StringVar(value=storage_backend)
+    backend_frame = tk.Frame(window)
+    backend_frame.pack(anchor="w", padx=20)
+    tk.Radiobutton(backend_frame, text="CSV", variable=storage_backend_var, value="csv").pack(side="left")
+    tk.Radiobutton(backend_frame, text="SQLite", variable=storage_backend_var, value="sqlite").pack(side="left")
+    tk.Button(backend_frame, text="CSV→SQLite取り込み", command=import_to_sqlite).pack(side="left", padx=5)
+    tk.Button(backend_frame, text="SQLite→CSV書き出し", command=export_from_sqlite).pack(side="left", padx=5)
+
+    # 集計対象（別アカウント・過去シーズンの記録ファイルをまとめて集計する）
+    tk.Label(window, text="集計対象:").pack(anchor="w", pady=(10, 0), padx=10)
+    merge_sources_var = tk.BooleanVar(value=merge_sources)
+    tk.Checkbutton(window, text=f"{SOURCES_FILE} の記録ファイルもまとめて集計する", variable=merge_sources_var).pack(
+        anchor="w", padx=20)
+    tk.Button(window, text="記録ファイルの一覧を開く", command=open_record_sources).pack(anchor="w", padx=20)
+
     # 保存ボタン
     save_button = tk.Button(window, text="変更を保存", command=save_changes)
     save_button.pack(pady=10)
\ No newline at end of file
@@ -0,0 +1,51 @@
+import json
+import os
+import numpy as np
+
+# サイドカーファイルの形式バージョン（列構成を変えたら上げる）
+SIDECAR_FORMAT = 2
+
+
+def sidecar_path(csv_path):
+    """CSVの隣に置くサイドカーファイルのパス"""
+    return os.path.splitext(csv_path)[0] + ".cache.npz"
+
+
+def save_sidecar(csv_path, arrays, deck_names, meta):
+    """
+    解析済みの列データをサイドカーに保存する。
+    一時ファイルに書いてから置き換えるので、途中で落ちても壊れたファイルは残らない。
+    :param arrays: 列名 -> NumPy配列 の辞書
+    :param meta: 元CSVの検証用情報（mtime, サイズ, 解析位置など）
+    """
+    path = sidecar_path(csv_path)
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps(dict(meta, format=SIDECAR_FORMAT))),
+                deck_names=np.array(deck_names, dtype=str),
+                **arrays,
+            )
+        os.replace(temp_path, path)
+    except OSError:
+        # キャッシュなので保存できなくても動作には影響しない
+        pass
+
+
+def load_sidecar(csv_path):
+    """
+    サイドカーを読み込む。
+    :return: (列名 -> 配列 の辞書, デッキ名リスト, メタ情報)。存在しない・壊れている場合は None
+    """
+    try:
+        with np.load(sidecar_path(csv_path), allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("format") != SIDECAR_FORMAT:
+                return None
+            arrays = {name: data[name] for name in data.files if name not in ("meta", "deck_names")}
+            deck_names = data["deck_names"].tolist()
+    except (OSError, ValueError, KeyError):
+        return None
+    return arrays, deck_names, meta
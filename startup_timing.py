@@ -0,0 +1,25 @@
+import time
+
+# 起動時間の基準（main.py の最初に読み込むことで、以降の読み込みや画面作成の時間を測る）
+_start = time.perf_counter()
+# (区切りの名前, 基準からの経過秒数)
+_marks = []
+
+
+def mark(label):
+    """起動処理の区切りを記録する"""
+    _marks.append((label, time.perf_counter() - _start))
+
+
+def format_report():
+    """記録した区切りごとの経過時間を文字列にする"""
+    lines = ["起動時間:"]
+    previous = 0.0
+    for label, elapsed in _marks:
+        lines.append(f"  {label}: {elapsed * 1000:.0f} ms (+{(elapsed - previous) * 1000:.0f} ms)")
+        previous = elapsed
+    return "\n".join(lines)
+
+
+def print_report():
+    print(format_report())
\ No newline at end of file
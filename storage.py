@@ -0,0 +1,558 @@
+import csv
+import os
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from record_store import (CSV_ENCODING, CSV_FILE, RecordStore, file_signature, month_key, month_number, parse_date,
+                          TAIL_MARKER_SIZE, read_last_record, shared_store, synchronized)
+from settings_store import shared_settings
+
+# SQLiteデータベースファイル名
+DB_FILE = "master_duel_records.db"
+# 記録の列（save_record が書き込む順）
+FIELDNAMES = ["date", "deck", "coin", "turn", "opponent_deck", "result", "rank", "rate", "memo"]
+# 一緒に集計する追加の記録ファイル（別アカウント・過去シーズンなど）の一覧（名前, パス）
+SOURCES_FILE = "record_sources.csv"
+SOURCES_FIELDNAMES = ["source", "path"]
+# まとめて読んだ記録に付ける、出どころの名前の列
+SOURCE_COLUMN = "source"
+# 設定中の保存先の記録の出どころ名
+MAIN_SOURCE = "メイン"
+# 記録ファイルを並列に読み込むスレッド数
+LOAD_WORKERS = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    month INTEGER NOT NULL,  -- 年*12 + 月-1（解釈できない日付は -1）
+    date TEXT NOT NULL DEFAULT '',
+    deck TEXT NOT NULL DEFAULT '',
+    coin TEXT NOT NULL DEFAULT '',
+    turn TEXT NOT NULL DEFAULT '',
+    opponent_deck TEXT NOT NULL DEFAULT '',
+    result TEXT NOT NULL DEFAULT '',
+    rank TEXT NOT NULL DEFAULT '',
+    rate TEXT NOT NULL DEFAULT '',
+    memo TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_records_month ON records(month);
+CREATE INDEX IF NOT EXISTS idx_records_date ON records(date);
+CREATE INDEX IF NOT EXISTS idx_records_deck ON records(deck);
+CREATE INDEX IF NOT EXISTS idx_records_opponent_deck ON records(opponent_deck);
+-- 書き込みのたびに増える世代と、追記以外の書き込みのたびに増える世代
+-- （ファイルに残る集計や、他のプロセスの書き込みを含めた集計キャッシュの有効性の判定用）
+CREATE TABLE IF NOT EXISTS storage_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL,
+    rewrite_generation INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO storage_state (id, generation) VALUES (1, 0);
+"""
+# 書き込みのトランザクション内で実行し、世代を進める（追記の場合）
+_BUMP_GENERATION = "UPDATE storage_state SET generation = generation + 1"
+# 追記以外（置き換え・編集・削除）の場合
+_BUMP_REWRITE_GENERATION = ("UPDATE storage_state SET generation = generation + 1, "
+                            "rewrite_generation = rewrite_generation + 1")
+
+
+def _to_month_number(month):
+    """'2023/10' または (年, 月) を月の通し番号に変換する"""
+    return month_number(month if isinstance(month, tuple) else month_key(month))
+
+
+class CsvStorage:
+    """CSVファイルに記録を保存するバックエンド（解析済みデータは RecordStore にキャッシュ）"""
+
+    def __init__(self, path=CSV_FILE):
+        self.path = path
+        self.store = shared_store if path == CSV_FILE else RecordStore(path)
+
+    @property
+    def fieldnames(self):
+        self.store.refresh()
+        return self.store.fieldnames
+
+    @property
+    def version(self):
+        """記録が変わるたびに増える値（集計キャッシュの判定用）"""
+        self.store.refresh()
+        return self.store.version
+
+    @property
+    def rewrite_version(self):
+        """末尾への追記以外で記録が変わるたびに増える値"""
+        self.store.refresh()
+        return self.store.rewrite_version
+
+    def get_rows(self):
+        return self.store.get_rows()
+
+    def row_count(self):
+        return len(self.store.get_rows())
+
+    def rows_slice(self, start, count):
+        """start 件目から count 件（-1 なら最後まで）の (行のキー, 記録) を返す。CSVのキーはファイル内の行番号"""
+        rows = self.store.get_rows()
+        return list(enumerate(rows[start:] if count < 0 else rows[start:start + count], start))
+
+    def rows_by_month(self, month):
+        return self.store.rows_by_month(month)
+
+    def rows_in_range(self, start=None, end=None):
+        return self.store.rows_in_range(start, end)
+
+    def last_record(self):
+        return read_last_record(self.path)
+
+    def state_token(self):
+        """記録の状態を表す値（CSVの (mtime, size)）。ファイルに保存した集計の有効性の判定に使う"""
+        signature = file_signature(self.path)
+        return list(signature) if signature else None
+
+    def months_of(self, keys):
+        """行のキーの記録が属する月の通し番号の集合（日付を解釈できない行は -1）"""
+        rows = self.store.get_rows()
+        return {month_number(month_key(rows[key].get("date") or "")) for key in keys if key < len(rows)}
+
+    def append(self, record):
+        self.store.append(record)
+
+    def append_many(self, records):
+        """複数の記録をまとめて追記する（fsync 済みで戻る）"""
+        self.store.append_many(records)
+
+    def commit_marker(self):
+        """
+        追記前の状態を表す値（CSVのバイト数と、その位置までの末尾バイト列）。rollback_to でこの状態に戻せる。
+        JSONにそのまま書ける値で返す。
+        """
+        signature = file_signature(self.path)
+        size = signature[1] if signature else 0
+        tail = b""
+        if size:
+            with open(self.path, "rb") as f:
+                f.seek(max(0, size - TAIL_MARKER_SIZE))
+                tail = f.read(size - f.tell())
+        return {"size": size, "tail": tail.hex()}
+
+    def rollback_to(self, marker):
+        """
+        commit_marker の時点より後に追記された内容（書きかけの行を含む）を取り消す。
+        その後にファイルが末尾への追記以外で変わっていれば（外部で編集された場合など）切り詰めずに False を返す。
+        """
+        if not isinstance(marker, dict):
+            return False
+        size, tail = marker["size"], bytes.fromhex(marker["tail"])
+        signature = file_signature(self.path)
+        current = signature[1] if signature else 0
+        if current == size:
+            return True  # 追記されていない
+        if current < size:
+            return False
+        with open(self.path, "rb") as f:
+            f.seek(size - len(tail))
+            if f.read(len(tail)) != tail:
+                return False
+        self.store.truncate(size)
+        return True
+
+    def replace_all(self, fieldnames, rows):
+        self.store.replace_all(fieldnames, rows)
+
+    def clear(self):
+        """全記録を削除する（CSVファイルを削除し、次の保存で見出し行から書き直す）"""
+        self.store.truncate(0)
+
+    def apply_changes(self, updates, deletes, inserts):
+        """変更行だけを反映して保存する（一時ファイル経由で置き換え）"""
+        self.store.apply_changes(updates, deletes, inserts)
+
+    def matchup_counts(self, month=None):
+        """(使用デッキ, 相手デッキ) ごとの (対戦数, 勝ち数) を返す"""
+        rows = self.get_rows() if month is None else self.rows_by_month(month)
+        games = Counter((row["deck"], row["opponent_deck"]) for row in rows)
+        wins = Counter((row["deck"], row["opponent_deck"]) for row in rows if row["result"] == "勝")
+        return {key: (count, wins[key]) for key, count in games.items()}
+
+
+class SqliteStorage:
+    """SQLiteデータベースに記録を保存するバックエンド（月・デッキで索引付き）"""
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self.fieldnames = list(FIELDNAMES)
+        # 分析用スレッドからも使うため、接続はロックで排他する
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(storage_state)")]
+        if "rewrite_generation" not in columns:  # 追記以外の世代がない以前のデータベース
+            with self._conn:
+                self._conn.execute("ALTER TABLE storage_state ADD COLUMN rewrite_generation INTEGER NOT NULL DEFAULT 0")
+        self._columns = ", ".join(FIELDNAMES)
+        self._insert_sql = (f"INSERT INTO records (month, {self._columns}) "
+                            f"VALUES ({', '.join('?' * (len(FIELDNAMES) + 1))})")
+
+    @synchronized
+    def _select(self, where="", params=(), suffix=""):
+        cursor = self._conn.execute(f"SELECT {self._columns} FROM records {where} {suffix}", params)
+        return [dict(zip(FIELDNAMES, row)) for row in cursor]
+
+    @staticmethod
+    def _values(record):
+        """辞書形式の記録を INSERT 用の値の並びに変換する"""
+        values = [str(record.get(name, "")) for name in FIELDNAMES]
+        return [month_number(month_key(values[0]))] + values
+
+    def get_rows(self):
+        return self._select(suffix="ORDER BY id")
+
+    @synchronized
+    def row_count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    @synchronized
+    def rows_slice(self, start, count):
+        """start 件目から count 件（-1 なら最後まで）の (行のキー, 記録) を返す。SQLiteのキーは id"""
+        cursor = self._conn.execute(
+            f"SELECT id, {self._columns} FROM records ORDER BY id LIMIT ? OFFSET ?", (count, start)
+        )
+        return [(row[0], dict(zip(FIELDNAMES, row[1:]))) for row in cursor]
+
+    def rows_by_month(self, month):
+        return self._select("WHERE month = ?", (_to_month_number(month),), "ORDER BY id")
+
+    def rows_in_range(self, start=None, end=None):
+        """start～end（両端を含む）の記録を返す。月の索引で絞り込んでから日付を比較する"""
+        if start is None and end is None:
+            return self.get_rows()
+        first = month_number((start.year, start.month)) if start else 0
+        last = month_number((end.year, end.month)) if end else 2 ** 31
+        rows = self._select("WHERE month BETWEEN ? AND ?", (first, last), "ORDER BY month, id")
+        in_range = []
+        for row in rows:
+            day = parse_date(row["date"])
+            if day is not None and (start is None or day >= start) and (end is None or day <= end):
+                in_range.append(row)
+        return in_range
+
+    def last_record(self):
+        rows = self._select(suffix="ORDER BY id DESC LIMIT 1")
+        return rows[0] if rows else None
+
+    @property
+    @synchronized
+    def version(self):
+        """
+        書き込みのたびに増える値（集計キャッシュの判定用）。
+        データベースに記録した世代なので、他のプロセスの書き込みでも変わる。
+        """
+        return self.state_token()
+
+    @property
+    @synchronized
+    def rewrite_version(self):
+        """追記以外（置き換え・編集・削除）の書き込みのたびに増える値（他のプロセスの書き込みを含む）"""
+        return self._conn.execute("SELECT rewrite_generation FROM storage_state").fetchone()[0]
+
+    @synchronized
+    def state_token(self):
+        """記録の状態を表す値（書き込みのたびに増える世代）。ファイルに保存した集計の有効性の判定に使う"""
+        return self._conn.execute("SELECT generation FROM storage_state").fetchone()[0]
+
+    @synchronized
+    def months_of(self, keys):
+        """行のキー（id）の記録が属する月の通し番号の集合"""
+        months = set()
+        for key in keys:
+            months.update(row[0] for row in self._conn.execute("SELECT month FROM records WHERE id = ?", (key,)))
+        return months
+
+    @synchronized
+    def append(self, record):
+        with self._conn:
+            self._conn.execute(self._insert_sql, self._values(record))
+            self._conn.execute(_BUMP_GENERATION)
+
+    @synchronized
+    def append_many(self, records):
+        """複数の記録を1トランザクションで追記する"""
+        with self._conn:
+            self._conn.executemany(self._insert_sql, (self._values(record) for record in records))
+            self._conn.execute(_BUMP_GENERATION)
+
+    @synchronized
+    def commit_marker(self):
+        """追記前の状態を表す値（最大の id と世代）。rollback_to でこの状態に戻せる"""
+        return {"id": self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM records").fetchone()[0],
+                "generation": self.state_token()}
+
+    @synchronized
+    def rollback_to(self, marker):
+        """
+        commit_marker の時点より後に追記された記録を削除する。
+        その後の書き込みが1回の追記だけでなければ（世代が2つ以上進んでいれば）削除せずに False を返す。
+        """
+        if not isinstance(marker, dict):
+            return False
+        generation = self.state_token()
+        if generation == marker["generation"]:
+            return True  # 追記されていない（トランザクションが取り消された）
+        if generation != marker["generation"] + 1:
+            return False
+        with self._conn:
+            if self._conn.execute("DELETE FROM records WHERE id > ?", (marker["id"],)).rowcount:
+                self._conn.execute(_BUMP_REWRITE_GENERATION)
+        return True
+
+    @synchronized
+    def replace_all(self, fieldnames, rows):
+        """
+        全記録を置き換える。
+        :param rows: 値のリストのリスト（fieldnamesと同じ並び）
+        """
+        with self._conn:
+            self._conn.execute("DELETE FROM records")
+            self._conn.executemany(self._insert_sql, (self._values(dict(zip(fieldnames, row))) for row in rows))
+            self._conn.execute(_BUMP_REWRITE_GENERATION)
+
+    def clear(self):
+        """全記録を削除する"""
+        self.replace_all(FIELDNAMES, [])
+
+    @synchronized
+    def apply_changes(self, updates, deletes, inserts):
+        """
+        変更のあった行だけを1トランザクションで更新する。
+        :param updates: id -> 新しい値のリスト（FIELDNAMESと同じ並び）
+        :param deletes: 削除する id の集合
+        :param inserts: 追加する値のリストのリスト
+        """
+        assignments = ", ".join(f"{name} = ?" for name in ["month"] + FIELDNAMES)
+        with self._conn:
+            self._conn.executemany("DELETE FROM records WHERE id = ?", ((key,) for key in deletes))
+            self._conn.executemany(
+                f"UPDATE records SET {assignments} WHERE id = ?",
+                (self._values(dict(zip(FIELDNAMES, values))) + [key] for key, values in updates.items()),
+            )
+            self._conn.executemany(self._insert_sql, (self._values(dict(zip(FIELDNAMES, values))) for values in inserts))
+            self._conn.execute(_BUMP_REWRITE_GENERATION)
+
+    @synchronized
+    def matchup_counts(self, month=None):
+        """(使用デッキ, 相手デッキ) ごとの (対戦数, 勝ち数) を返す"""
+        where, params = ("WHERE month = ?", (_to_month_number(month),)) if month is not None else ("", ())
+        cursor = self._conn.execute(
+            f"SELECT deck, opponent_deck, COUNT(*), SUM(result = '勝') FROM records {where} "
+            "GROUP BY deck, opponent_deck",
+            params,
+        )
+        return {(deck, opponent): (games, wins) for deck, opponent, games, wins in cursor}
+
+    @synchronized
+    def close(self):
+        self._conn.close()
+
+
+# 記録ファイルを並列に読み込む共有スレッドプール
+_load_executor = ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix="record-load")
+
+
+class MergedStorage:
+    """
+    設定中の保存先と追加の記録ファイルをまとめて読む、集計用の保存先（書き込みはできない）。
+    各記録には出どころの名前を SOURCE_COLUMN 列に付ける。
+    記録は追加のファイルの順に並べ、最後に設定中の保存先の記録を置く
+    （記録の保存が末尾への追記になり、全履歴の表を追記分だけで更新できる）。
+    """
+
+    def __init__(self, primary, sources):
+        """
+        :param primary: 設定中の保存先（CsvStorage / SqliteStorage）
+        :param sources: 追加の記録ファイルの (名前, パス) のリスト
+        """
+        self.primary = primary
+        self.fieldnames = FIELDNAMES + [SOURCE_COLUMN]
+        self.parts = [(name, CsvStorage(path)) for name, path in sources] + [(MAIN_SOURCE, primary)]
+        self._rows = []
+        self._rows_version = None  # _rows を作った時点の version
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """変更された記録ファイルを、スレッドプールで並列に読み込む"""
+        stores = [part.store for _, part in self.parts if isinstance(part, CsvStorage)]
+        list(_load_executor.map(RecordStore.refresh, stores))
+
+    @property
+    def version(self):
+        """いずれかの記録が変わるたびに変わる値"""
+        self.refresh()
+        return tuple(part.version for _, part in self.parts)
+
+    @property
+    def rewrite_version(self):
+        """設定中の保存先への追記以外の変更（追加のファイルの変更を含む）で変わる値"""
+        self.refresh()
+        return tuple(part.version for _, part in self.parts[:-1]) + (self.primary.rewrite_version,)
+
+    def _tagged(self, read):
+        """各保存先から read(保存先) で読んだ記録に、出どころの名前を付けて連結する"""
+        self.refresh()
+        return [{**row, SOURCE_COLUMN: name} for name, part in self.parts for row in read(part)]
+
+    @synchronized
+    def get_rows(self):
+        version = self.version
+        if version != self._rows_version:
+            self._rows = self._tagged(lambda part: part.get_rows())
+            self._rows_version = version
+        return self._rows
+
+    def row_count(self):
+        self.refresh()
+        return sum(part.row_count() for _, part in self.parts)
+
+    def rows_slice(self, start, count):
+        """start 件目から count 件（-1 なら最後まで）の (通し番号, 記録) を返す。該当する保存先だけを読む"""
+        self.refresh()
+        rows = []
+        offset = 0
+        for name, part in self.parts:
+            length = part.row_count()
+            begin = max(start - offset, 0)
+            if begin < length and (count < 0 or len(rows) < count):
+                remaining = -1 if count < 0 else count - len(rows)
+                rows += [{**row, SOURCE_COLUMN: name} for _, row in part.rows_slice(begin, remaining)]
+            offset += length
+        return list(enumerate(rows, start))
+
+    def rows_by_month(self, month):
+        return self._tagged(lambda part: part.rows_by_month(month))
+
+    def rows_in_range(self, start=None, end=None):
+        """start～end（両端を含む）の記録を、保存先ごとに月順で返す"""
+        return self._tagged(lambda part: part.rows_in_range(start, end))
+
+    def last_record(self):
+        return self.primary.last_record()
+
+
+def _with_sqlite(transfer, storage=None):
+    """
+    SQLiteの保存先で transfer(保存先) を行う。
+    保存先を省略した場合、使用中のバックエンドがSQLiteならそれを使い（書き込みが集計キャッシュに反映される）、
+    そうでなければ一時的に開いて終わったら閉じる。
+    """
+    if storage is None and isinstance(_current_storage.get("storage"), SqliteStorage):
+        storage = _current_storage["storage"]
+    if storage is not None:
+        return transfer(storage)
+    temporary = SqliteStorage()
+    try:
+        return transfer(temporary)
+    finally:
+        temporary.close()
+
+
+def import_csv(csv_path=CSV_FILE, storage=None):
+    """CSVの全記録をSQLiteに取り込む（既存の内容は置き換える）"""
+    source = RecordStore(csv_path)
+    rows = source.get_rows()
+    values = [[row.get(name, "") for name in source.fieldnames] for row in rows]
+    _with_sqlite(lambda sqlite: sqlite.replace_all(source.fieldnames, values), storage)
+    return len(rows)
+
+
+def export_csv(csv_path=CSV_FILE, storage=None):
+    """
+    SQLiteの全記録をCSVに書き出す（一時ファイル経由で置き換え、途中で終了してもCSVを壊さない）。
+    SQLiteのファイルがない・記録がない場合は、CSVを空にしないよう書き出さずに ValueError を送出する。
+    """
+    if storage is None and not isinstance(_current_storage.get("storage"), SqliteStorage) \
+            and not os.path.exists(DB_FILE):
+        raise ValueError("SQLiteの記録ファイルがありません。")
+    rows = _with_sqlite(lambda sqlite: sqlite.get_rows(), storage)
+    if not rows:
+        raise ValueError("SQLiteに書き出す記録がありません。")
+    temp_path = csv_path + ".tmp"
+    with open(temp_path, "w", encoding=CSV_ENCODING, newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, csv_path)
+    return len(rows)
+
+
+def load_backend_setting():
+    """設定から保存形式（csv / sqlite）を読み込む"""
+    return shared_settings.get("StorageBackend", "csv")
+
+
+def load_merge_setting():
+    """設定から、追加の記録ファイルも集計に含めるかを読み込む"""
+    return shared_settings.get("MergeSources", "no") == "yes"
+
+
+def create_record_sources_file(path=SOURCES_FILE):
+    """追加の記録ファイルの一覧がなければ、見出しだけのファイルを作る（設定画面から編集できるようにする）"""
+    if not os.path.exists(path):
+        with open(path, "w", encoding=CSV_ENCODING, newline="") as f:
+            csv.writer(f).writerow(SOURCES_FIELDNAMES)
+
+
+def load_record_sources(path=SOURCES_FILE):
+    """
+    追加の記録ファイルを (名前, パス) のリストで読み込む。ファイルがなければ空のリスト。
+    設定中の保存先のCSV（SQLite使用時は取り込み元のCSV）は重複して数えないよう除く。
+    """
+    if not os.path.exists(path):
+        return []
+    main_path = os.path.abspath(CSV_FILE)
+    with open(path, "r", encoding=CSV_ENCODING, newline="") as f:
+        return [(row["source"].strip(), row["path"].strip()) for row in csv.DictReader(f)
+                if (row.get("source") or "").strip() and (row.get("path") or "").strip()
+                and os.path.abspath(row["path"].strip()) != main_path]
+
+
+# 使用中のバックエンド
+_current_storage = {}
+
+
+def get_storage():
+    """設定に応じた保存先バックエンドを返す（初回のみ設定を読む）"""
+    if "storage" not in _current_storage:
+        if load_backend_setting() == "sqlite":
+            first_time = not os.path.exists(DB_FILE)
+            storage = SqliteStorage()
+            if first_time and os.path.exists(CSV_FILE):
+                # 初めてSQLiteを使う場合は既存のCSVを取り込む
+                import_csv(CSV_FILE, storage)
+        else:
+            storage = CsvStorage()
+        _current_storage["storage"] = storage
+    return _current_storage["storage"]
+
+
+def use_merged_storage(merged):
+    """集計に追加の記録ファイルもまとめて使うかを選ぶ（設定によらず選ぶ場合にも使う）"""
+    storage = get_storage()
+    _current_storage["analysis"] = MergedStorage(storage, load_record_sources()) if merged else storage
+
+
+def get_analysis_storage():
+    """集計に使う保存先を返す（設定で有効なら追加の記録ファイルもまとめた MergedStorage）"""
+    if "analysis" not in _current_storage:
+        use_merged_storage(load_merge_setting())
+    return _current_storage["analysis"]
+
+
+def reset_storage():
+    """設定変更後に呼び、次回の get_storage でバックエンドを選び直す"""
+    _current_storage.pop("analysis", None)
+    storage = _current_storage.pop("storage", None)
+    if isinstance(storage, SqliteStorage):
+        storage.close()